@@ -13,14 +13,60 @@ Byggd för Windows 11, men fungerar på alla plattformar.
 from flask import Flask, request, jsonify, send_from_directory, abort
 from datetime import datetime
 from urllib.parse import urlparse, parse_qs
+import atexit
+import logging
+import logging.handlers
 import os
 import json
 import hashlib
+import sys
 import threading
+import time
 import re
 
+try:
+    import orjson  # Valfritt: snabbare JSON-serialisering
+except ImportError:
+    orjson = None
+
 app = Flask(__name__)
 
+
+class _BatchedConsoleHandler(logging.handlers.MemoryHandler):
+    """Samlar loggrader och skriver dem till stdout med ett enda write() per omgång."""
+
+    def __init__(self, capacity: int = 256):
+        super().__init__(capacity, flushLevel=logging.ERROR)
+        self.setFormatter(logging.Formatter("%(message)s"))
+
+    def flush(self) -> None:
+        with self.lock:
+            if not self.buffer:
+                return
+            chunk = "".join(self.format(record) + "\n" for record in self.buffer)
+            self.buffer.clear()
+        try:
+            sys.stdout.write(chunk)
+            sys.stdout.flush()
+        except Exception:
+            pass
+
+
+def _flush_log_periodically(interval: float = 1.0) -> None:
+    while True:
+        time.sleep(interval)
+        _LOG_HANDLER.flush()
+
+
+# Konsolloggning: buffras och skrivs vid 256 rader, vid fel, eller varje sekund
+# (sekundtråden startas av serverstarten nedan, inte vid import)
+_LOG_HANDLER = _BatchedConsoleHandler()
+logger = logging.getLogger("collector")
+logger.setLevel(logging.INFO)
+logger.addHandler(_LOG_HANDLER)
+logger.propagate = False
+atexit.register(_LOG_HANDLER.flush)
+
 # ========================================
 # CONFIGURATION FLAGS
 # ========================================
@@ -28,6 +74,7 @@ ENABLE_DATA_LOGGING = True      # Save to info_server/ directory
 ENABLE_TRAFFIC_LOG = True       # Save to log/traffic.log
 ENABLE_DOCUMENT_SAVE = True     # Save interesting docs to log/documents/
 ENABLE_KUNGORELSE_CAPTURE = True  # Save individual kungorelse pages to subfolders
+MAX_KUNGORELSE_BYTES = 20_000_000  # Max request body for /save_kungorelse
 # ========================================
 
 # --- Kataloger ---
@@ -44,6 +91,17 @@ TRAFFIC_LOG_PATH = os.path.join(LOG_DIR, "traffic.log")
 INDEX_LOCK = threading.Lock()
 LOG_LOCK = threading.Lock()
 
+# Senast lästa/skrivna dagsfil: path -> ((mtime_ns, size), tolkad data, kungorelseid:n).
+# Skyddas av INDEX_LOCK. Objekten muteras aldrig - en merge bygger nya.
+_DAY_FILE_CACHE: dict[str, tuple[tuple[int, int], dict, set]] = {}
+
+# /list: JSON-filer per datummapp, nyckel mappens mtime_ns - skyddas av _LIST_LOCK.
+# Mappens mtime ändras när filer skapas/tas bort, även av andra processer (headless-scrapern).
+# OBS: på filsystem med grov mtime (FAT/exFAT, vissa nätverksdiskar) kan en fil som skapas
+# inom samma tidssteg som förra listningen missas tills mappen ändras igen.
+_LIST_CACHE: dict[str, tuple[int, list[str]]] = {}
+_LIST_LOCK = threading.Lock()
+
 LANDING_PAGE_KEYWORDS = [
     "välkommen till post- och inrikes tidningar",
     "familjerätt",
@@ -81,18 +139,68 @@ EMAIL_DOMAIN_EXCLUDE_KEYWORDS = (
 
 # --- Hjälpare ---
 
-def _json_dumps(obj) -> str:
-    """Stabil och läsbar JSON-dump (UTF-8, sorterade nycklar)."""
-    return json.dumps(obj, ensure_ascii=False, sort_keys=True, indent=2)
+def _json_bytes(obj, sort_keys: bool = True) -> bytes:
+    """
+    Stabil, kompakt JSON-dump som UTF-8-bytes (orjson om installerat).
+    Filerna läses av pipelinen, inte av människor - därför ingen indentering.
+    """
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, option=option)
+    return json.dumps(
+        obj, ensure_ascii=False, sort_keys=sort_keys, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def _json_loads(data: bytes | str):
+    """Tolka JSON från bytes/str (orjson om installerat). Kastar ValueError vid fel."""
+    if orjson is not None:
+        return orjson.loads(data)
+    if isinstance(data, (bytes, bytearray)):
+        data = data.decode("utf-8", "replace")
+    return json.loads(data)
+
+
+_WRITE_FLAGS = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0)
+
+
+def _write_bytes(path: str, data: bytes) -> None:
+    """Skriv färdiga bytes med ett os.open/os.write, utan Pythons IO-lager."""
+    fd = os.open(path, _WRITE_FLAGS, 0o644)
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+
+
+def _atomic_write_bytes(path: str, data: bytes) -> None:
+    """Skriv till en temporär fil och byt namn - läsare ser aldrig en halvskriven fil."""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    _write_bytes(tmp, data)
+    os.replace(tmp, path)
 
 
 def _sha1_short(b: bytes) -> str:
-    return hashlib.sha1(b).hexdigest()[:12]
+    # Dedup-hash, inte säkerhet - usedforsecurity=False hoppar över FIPS-kontrollen
+    return hashlib.sha1(b, usedforsecurity=False).hexdigest()[:12]
+
+
+_NOW_STR_CACHE: tuple[int, str] = (0, "")
 
 
 def _now_str() -> str:
-    # Lokal tid YYYYMMDD_HHMMSS
-    return datetime.now().strftime("%Y%m%d_%H%M%S")
+    # Lokal tid YYYYMMDD_HHMMSS - strftime körs bara en gång per sekund
+    global _NOW_STR_CACHE
+    t = int(time.time())
+    cached = _NOW_STR_CACHE
+    if cached[0] != t:
+        cached = (t, datetime.fromtimestamp(t).strftime("%Y%m%d_%H%M%S"))
+        _NOW_STR_CACHE = cached
+    return cached[1]
 
 
 def _log_traffic(method: str, url: str, status: str, meta: dict) -> None:
@@ -226,18 +334,24 @@ def _save_interesting_document(data: dict | list, url: str) -> None:
                       "data": data, "timestamp": _now_str()}, 
                      f, ensure_ascii=False, indent=2)
         
-        print(f"[INTERESTING] Saved {filename} ({len(data) if isinstance(data, list) else 1} items)")
+        logger.info(f"[INTERESTING] Saved {filename} ({len(data) if isinstance(data, list) else 1} items)")
     except Exception as e:
-        print(f"[DOC SAVE ERROR] {e}")
+        logger.error(f"[DOC SAVE ERROR] {e}")
 
 
-def _get_index_path():
-    """Get index path for today's date folder (or TARGET_DATE if set)"""
-    import os
-    date_str = os.environ.get('TARGET_DATE', datetime.now().strftime("%Y%m%d"))
-    print(f"[SERVER] _get_index_path: Använder datum: {date_str} (TARGET_DATE={'satt' if os.environ.get('TARGET_DATE') else 'ej satt'})")
+def _get_date_folder(caller: str) -> tuple[str, str]:
+    """Datum (TARGET_DATE eller idag) och dess mapp i DATA_DIR, skapad vid behov."""
+    target_date = os.environ.get('TARGET_DATE')
+    date_str = target_date or datetime.now().strftime("%Y%m%d")
+    logger.info(f"[SERVER] {caller}: Använder datum: {date_str} (TARGET_DATE={'satt' if target_date else 'ej satt'})")
     date_folder = os.path.join(DATA_DIR, date_str)
     os.makedirs(date_folder, exist_ok=True)
+    return date_str, date_folder
+
+
+def _get_index_path():
+    """Get index path for today's date folder (or TARGET_DATE if set)"""
+    _, date_folder = _get_date_folder("_get_index_path")
     return os.path.join(date_folder, "_index.json")
 
 
@@ -246,18 +360,38 @@ def _load_index() -> dict:
     if not os.path.exists(index_path):
         return {}
     try:
-        with open(index_path, "r", encoding="utf-8") as f:
-            return json.load(f)
+        with open(index_path, "rb") as f:
+            return _json_loads(f.read())
     except Exception:
         return {}
 
 
 def _save_index(idx: dict) -> None:
-    index_path = _get_index_path()
-    tmp = index_path + ".tmp"
-    with open(tmp, "w", encoding="utf-8") as f:
-        json.dump(idx, f, ensure_ascii=False, indent=2, sort_keys=True)
-    os.replace(tmp, index_path)
+    _atomic_write_bytes(_get_index_path(), _json_bytes(idx))
+
+
+def _file_key(path: str) -> tuple[int, int]:
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+def _item_ids(items) -> set:
+    if not isinstance(items, list):
+        return set()
+    return {item["kungorelseid"] for item in items if isinstance(item, dict) and "kungorelseid" in item}
+
+
+def _load_day_file(path: str) -> tuple[dict, set]:
+    """Dagsfilens data och kungorelseid:n, cachade tills filen ändras. Anropas under INDEX_LOCK."""
+    key = _file_key(path)
+    cached = _DAY_FILE_CACHE.get(path)
+    if cached and cached[0] == key:
+        return cached[1], cached[2]
+    with open(path, "rb") as f:
+        data = _json_loads(f.read())
+    ids = _item_ids(data.get("data")) if isinstance(data, dict) else set()
+    _DAY_FILE_CACHE[path] = (key, data, ids)
+    return data, ids
 
 
 TARGET_KEYS = {
@@ -483,7 +617,7 @@ def _normalize_payload(incoming: dict | list | str | bytes) -> tuple[dict, bytes
         incoming_bytes = request.get_data(cache=False) or b""
         # Försök tolka som JSON
         try:
-            parsed = json.loads(incoming_bytes.decode("utf-8", "replace"))
+            parsed = _json_loads(incoming_bytes)
             incoming = parsed
         except Exception:
             incoming = None
@@ -492,7 +626,7 @@ def _normalize_payload(incoming: dict | list | str | bytes) -> tuple[dict, bytes
     # Om vi fick in bytes/str direkt
     if isinstance(incoming, (bytes, bytearray)):
         try:
-            body_obj = json.loads(incoming.decode("utf-8", "replace"))
+            body_obj = _json_loads(incoming)
             incoming = body_obj
         except Exception:
             raw_text = incoming.decode("utf-8", "replace")
@@ -501,7 +635,7 @@ def _normalize_payload(incoming: dict | list | str | bytes) -> tuple[dict, bytes
     if isinstance(incoming, str):
         # Kan vara JSON-sträng
         try:
-            body_obj = json.loads(incoming)
+            body_obj = _json_loads(incoming)
             incoming = body_obj
         except Exception:
             raw_text = incoming
@@ -521,13 +655,13 @@ def _normalize_payload(incoming: dict | list | str | bytes) -> tuple[dict, bytes
             raw_text = ""  # borde inte hända, men säkra
         meta = _extract_metadata(None, raw_text)
         packed = {"meta": meta, "raw_text": raw_text}
-        raw_bytes = _json_dumps(packed).encode("utf-8")
+        raw_bytes = _json_bytes(packed)
         return packed, raw_bytes
 
     # Bygg metadata och slutlig struktur
     meta = _extract_metadata(url, body_obj)
     packed = {"meta": meta, "data": body_obj}
-    raw_bytes = _json_dumps(packed).encode("utf-8")
+    raw_bytes = _json_bytes(packed)
     return packed, raw_bytes
 
 
@@ -544,13 +678,8 @@ def _save_payload(packed_obj: dict, raw_bytes: bytes) -> dict:
     - Returnerar metadata om sparningen.
     """
     # Use date as filename base (one file per day)
-    import os
-    date_str = os.environ.get('TARGET_DATE', datetime.now().strftime("%Y%m%d"))
-    print(f"[SERVER] _save_payload: Använder datum: {date_str} (TARGET_DATE={'satt' if os.environ.get('TARGET_DATE') else 'ej satt'})")
-    
     # Create date folder if it doesn't exist
-    date_folder = os.path.join(DATA_DIR, date_str)
-    os.makedirs(date_folder, exist_ok=True)
+    date_str, date_folder = _get_date_folder("_save_payload")
     
     filename = f"kungorelser_{date_str}.json"
     path = os.path.join(date_folder, filename)
@@ -561,7 +690,7 @@ def _save_payload(packed_obj: dict, raw_bytes: bytes) -> dict:
     if isinstance(packed_obj.get("data"), list):
         cleaned, stats = _deduplicate_kungorelse_items(packed_obj["data"])
         if stats["removed"] or stats["filtered_keywords"] or stats["filtered_accounting"]:
-            print(
+            logger.info(
                 "[DEDUP] Removed "
                 f"{stats['removed']} entries (same name: {stats['duplicate_names']}, "
                 f"same id: {stats['duplicate_ids']}, same email domain: {stats['duplicate_email_domains']}, "
@@ -570,7 +699,7 @@ def _save_payload(packed_obj: dict, raw_bytes: bytes) -> dict:
         packed_obj["data"] = cleaned
         if isinstance(packed_obj.get("meta"), dict):
             packed_obj["meta"]["item_count"] = len(cleaned)
-        raw_bytes = _json_dumps(packed_obj).encode("utf-8")
+        raw_bytes = _json_bytes(packed_obj)
 
     with INDEX_LOCK:
         idx = _load_index()
@@ -589,9 +718,8 @@ def _save_payload(packed_obj: dict, raw_bytes: bytes) -> dict:
         # Check if today's file already exists
         if os.path.exists(path):
             try:
-                # Read existing data
-                with open(path, "r", encoding="utf-8") as f:
-                    existing_data = json.load(f)
+                # Read existing data (reused from the last request if the file is unchanged)
+                existing_data, existing_ids = _load_day_file(path)
                 
                 # Merge with new data (if it's a list of items)
                 if "data" in packed_obj and "data" in existing_data:
@@ -602,7 +730,7 @@ def _save_payload(packed_obj: dict, raw_bytes: bytes) -> dict:
                         
                         # IMPORTANT: Only save if new list has MORE items than existing
                         if new_count <= existing_count:
-                            print(f"[SKIP] New list ({new_count} items) not larger than existing ({existing_count} items)")
+                            logger.info(f"[SKIP] New list ({new_count} items) not larger than existing ({existing_count} items)")
                             return {
                                 "ok": True,
                                 "status": "skipped_smaller",
@@ -615,11 +743,6 @@ def _save_payload(packed_obj: dict, raw_bytes: bytes) -> dict:
                             }
                         
                         # Merge lists, avoiding duplicates based on kungorelseid
-                        existing_ids = set()
-                        for item in existing_data["data"]:
-                            if isinstance(item, dict) and "kungorelseid" in item:
-                                existing_ids.add(item["kungorelseid"])
-                        
                         new_items = []
                         for item in packed_obj["data"]:
                             if isinstance(item, dict) and "kungorelseid" in item:
@@ -627,10 +750,13 @@ def _save_payload(packed_obj: dict, raw_bytes: bytes) -> dict:
                                     new_items.append(item)
                         
                         if new_items:
-                            existing_data["data"].extend(new_items)
-                            existing_data["meta"]["item_count"] = len(existing_data["data"])
-                            packed_obj = existing_data
-                            raw_bytes = _json_dumps(packed_obj).encode("utf-8")
+                            merged_items = existing_data["data"] + new_items
+                            packed_obj = {
+                                **existing_data,
+                                "meta": {**existing_data["meta"], "item_count": len(merged_items)},
+                                "data": merged_items,
+                            }
+                            raw_bytes = _json_bytes(packed_obj)
                             status = "updated"
                         else:
                             status = "duplicate"
@@ -646,8 +772,14 @@ def _save_payload(packed_obj: dict, raw_bytes: bytes) -> dict:
             status = "created"
         
         # Save the file
-        with open(path, "w", encoding="utf-8") as f:
-            f.write(raw_bytes.decode("utf-8"))
+        _atomic_write_bytes(path, raw_bytes)
+        
+        # What we just wrote is the file's content - next request skips the read
+        if status == "updated":
+            written_ids = existing_ids | _item_ids(new_items)
+        else:
+            written_ids = _item_ids(packed_obj.get("data"))
+        _DAY_FILE_CACHE[path] = (_file_key(path), packed_obj, written_ids)
         
         # Update index
         idx[h] = filename
@@ -670,24 +802,37 @@ def health():
     return jsonify({"ok": True, "service": "collector", "time": _now_str()})
 
 
+def _date_folder_files(name: str, mtime_ns: int) -> list[str]:
+    """JSON-filer i en datummapp, cachade tills mappens mtime ändras."""
+    with _LIST_LOCK:
+        cached = _LIST_CACHE.get(name)
+    if cached and cached[0] == mtime_ns:
+        return cached[1]
+    with os.scandir(os.path.join(DATA_DIR, name)) as entries:
+        files = [
+            f"{name}/{entry.name}"
+            for entry in entries
+            if entry.name.endswith(".json") and not entry.name.startswith("_") and entry.is_file()
+        ]
+    with _LIST_LOCK:
+        _LIST_CACHE[name] = (mtime_ns, files)
+    return files
+
+
 @app.get("/list")
 def list_files():
     """Lista sparade filer (senaste först) från datummappar."""
     all_files = []
     
-    # Gå igenom alla datummappar
-    for item in os.listdir(DATA_DIR):
-        item_path = os.path.join(DATA_DIR, item)
-        if os.path.isdir(item_path) and item.isdigit() and len(item) == 8:  # YYYYMMDD
-            # Leta efter JSON-filer i datummappen
-            for f in os.listdir(item_path):
-                if f.endswith(".json") and not f.startswith("_"):
-                    all_files.append(f"{item}/{f}")
-    
-    # Även kolla root för bakåtkompatibilitet
-    for f in os.listdir(DATA_DIR):
-        if f.endswith(".json") and not f.startswith("_") and not os.path.isdir(os.path.join(DATA_DIR, f)):
-            all_files.append(f)
+    with os.scandir(DATA_DIR) as entries:
+        for entry in entries:
+            if entry.is_dir():
+                if entry.name.isdigit() and len(entry.name) == 8:  # YYYYMMDD
+                    # Leta efter JSON-filer i datummappen (bara om den ändrats)
+                    all_files.extend(_date_folder_files(entry.name, entry.stat().st_mtime_ns))
+            elif entry.name.endswith(".json") and not entry.name.startswith("_"):
+                # Även kolla root för bakåtkompatibilitet
+                all_files.append(entry.name)
     
     all_files.sort(reverse=True)
     return jsonify({
@@ -705,30 +850,65 @@ def get_file(name: str):
     return send_from_directory(DATA_DIR, name, as_attachment=False)
 
 
+def _write_kungorelse_files(folder_path: str, data: dict) -> None:
+    """Skriv content.txt, content.html och data.json för en kungörelse."""
+    kungorelse_id = data.get("kungorelseId")
+    os.makedirs(folder_path, exist_ok=True)
+    
+    # Save text content
+    text_bytes = (
+        f"URL: {data.get('url', 'N/A')}\n"
+        f"Title: {data.get('title', 'N/A')}\n"
+        f"Timestamp: {data.get('timestamp', 'N/A')}\n"
+        f"{'='*60}\n\n"
+        f"{data.get('textContent', '')}"
+    ).encode("utf-8")
+    _write_bytes(os.path.join(folder_path, "content.txt"), text_bytes)
+    
+    # Save HTML content (for reference)
+    html_file = os.path.join(folder_path, "content.html")
+    _write_bytes(html_file, data.get('htmlContent', '').encode("utf-8"))
+    
+    # Save full JSON data
+    json_file = os.path.join(folder_path, "data.json")
+    _write_bytes(json_file, _json_bytes(data, sort_keys=False))
+    
+    # Log if enabled
+    if ENABLE_TRAFFIC_LOG:
+        _log_traffic("POST", f"/kungorelse/{kungorelse_id}", "saved", {"kungorelse_id": kungorelse_id})
+
+
 @app.post("/save_kungorelse")
 def save_kungorelse():
     """
     Save kungorelse page content to a dedicated folder.
     Creates a folder named after the kungorelseId (e.g., K739821-25).
     """
-    print(f"\n[KUNGORELSE] POST /save_kungorelse från {request.remote_addr}")
+    logger.info(f"\n[KUNGORELSE] POST /save_kungorelse från {request.remote_addr}")
     try:
-        data = request.get_json()
+        # Avvisa orimligt stora sidor innan bodyn läses in
+        content_length = request.content_length or 0
+        if content_length > MAX_KUNGORELSE_BYTES:
+            logger.error(f"  -> ERROR: Payload too large ({content_length} bytes)")
+            return jsonify({"ok": False, "error": "Payload too large"}), 413
+        
+        # Läs råa bytes en gång (ingen cache i request-objektet) och tolka direkt
+        data = _json_loads(request.get_data(cache=False))
         if not data:
-            print("  -> ERROR: No data received")
+            logger.error("  -> ERROR: No data received")
             return jsonify({"ok": False, "error": "No data received"}), 400
         
         kungorelse_id = data.get("kungorelseId")
         if not kungorelse_id:
-            print("  -> ERROR: No kungorelseId")
+            logger.error("  -> ERROR: No kungorelseId")
             return jsonify({"ok": False, "error": "No kungorelseId"}), 400
         
-        print(f"  -> Processing: {kungorelse_id}")
+        logger.info(f"  -> Processing: {kungorelse_id}")
         url = data.get("url")
         text_content = data.get("textContent", "")
 
         if not ENABLE_KUNGORELSE_CAPTURE:
-            print(f"[KUNGORELSE] Capture disabled, skipping {kungorelse_id}")
+            logger.info(f"[KUNGORELSE] Capture disabled, skipping {kungorelse_id}")
             return jsonify({
                 "ok": True,
                 "status": "skipped",
@@ -738,7 +918,7 @@ def save_kungorelse():
         
         is_valid, invalid_reason = _validate_kungorelse_payload(url, text_content)
         if not is_valid:
-            print(f"  -> SKIP {kungorelse_id}: {invalid_reason}")
+            logger.info(f"  -> SKIP {kungorelse_id}: {invalid_reason}")
             return jsonify({
                 "ok": True,
                 "status": "skipped_invalid_page",
@@ -748,11 +928,7 @@ def save_kungorelse():
             })
 
         # Create folder for this kungorelse in today's date folder
-        import os
-        date_str = os.environ.get('TARGET_DATE', datetime.now().strftime("%Y%m%d"))
-        print(f"[SERVER] save_kungorelse: Använder datum: {date_str} (TARGET_DATE={'satt' if os.environ.get('TARGET_DATE') else 'ej satt'})")
-        date_folder = os.path.join(DATA_DIR, date_str)
-        os.makedirs(date_folder, exist_ok=True)
+        _, date_folder = _get_date_folder("save_kungorelse")
         folder_path = os.path.join(date_folder, kungorelse_id)
         
         # Check if already exists and has meaningful content (deduplicering)
@@ -761,7 +937,7 @@ def save_kungorelse():
             file_size = os.path.getsize(text_file)
             # If file exists and has content (> 200 bytes = has actual text content, not just headers)
             if file_size > 200:
-                print(f"  -> SKIP {kungorelse_id}: Already exists with content ({file_size} bytes)")
+                logger.info(f"  -> SKIP {kungorelse_id}: Already exists with content ({file_size} bytes)")
                 return jsonify({
                     "ok": True,
                     "status": "already_exists",
@@ -770,33 +946,12 @@ def save_kungorelse():
                     "message": "Kungorelse already saved"
                 })
         
-        os.makedirs(folder_path, exist_ok=True)
+        # Synkront: pipelinen läser mappen direkt efter svaret
+        _write_kungorelse_files(folder_path, data)
         
-        # Save text content
-        with open(text_file, "w", encoding="utf-8") as f:
-            f.write(f"URL: {data.get('url', 'N/A')}\n")
-            f.write(f"Title: {data.get('title', 'N/A')}\n")
-            f.write(f"Timestamp: {data.get('timestamp', 'N/A')}\n")
-            f.write(f"{'='*60}\n\n")
-            f.write(data.get('textContent', ''))
-        
-        # Save HTML content (for reference)
-        html_file = os.path.join(folder_path, "content.html")
-        with open(html_file, "w", encoding="utf-8") as f:
-            f.write(data.get('htmlContent', ''))
-        
-        # Save full JSON data
-        json_file = os.path.join(folder_path, "data.json")
-        with open(json_file, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        
-        # Log if enabled
-        if ENABLE_TRAFFIC_LOG:
-            _log_traffic("POST", f"/kungorelse/{kungorelse_id}", "saved", {"kungorelse_id": kungorelse_id})
-        
-        print(f"[KUNGORELSE] OK Saved {kungorelse_id}")
-        print(f"  -> Path: {folder_path}")
-        print("  -> Files: content.txt, content.html, data.json")
+        logger.info(f"[KUNGORELSE] OK Saved {kungorelse_id}")
+        logger.info(f"  -> Path: {folder_path}")
+        logger.info("  -> Files: content.txt, content.html, data.json")
         
         return jsonify({
             "ok": True,
@@ -806,7 +961,7 @@ def save_kungorelse():
         })
         
     except Exception as e:
-        print(f"[KUNGORELSE ERROR] {e}")
+        logger.error(f"[KUNGORELSE ERROR] {e}")
         return jsonify({"ok": False, "error": str(e)}), 500
 
 
@@ -819,15 +974,15 @@ def save():
         2) <obj|lista>                             <- ren JSON
     - Om body inte är JSON: sparas ändå som JSON med fält "raw_text".
     """
-    print(f"\n[REQUEST] POST /save från {request.remote_addr}")
+    logger.info(f"\n[REQUEST] POST /save från {request.remote_addr}")
     # 1) Försök läsa JSON direkt
     incoming = None
     try:
-        incoming = request.get_json(force=False, silent=True)
+        incoming = _json_loads(request.get_data())
         if incoming:
-            print(f"  -> JSON mottagen, typ: {type(incoming).__name__}")
-    except Exception as e:
-        print(f"  -> JSON parse error: {e}")
+            logger.info(f"  -> JSON mottagen, typ: {type(incoming).__name__}")
+    except ValueError as e:
+        logger.warning(f"  -> JSON parse error: {e}")
         incoming = None
 
     # 2) Normalisera till {meta, data} eller {meta, raw_text}
@@ -860,16 +1015,26 @@ def save():
     if ENABLE_DATA_LOGGING and result.get('hash'):
         status_msg += f" [{result['hash'][:6]}]"
     if result['status'] != 'duplicate' and result['status'] != 'skipped':
-        print(f"{status_msg} | URL: {url_display}")
+        logger.info(f"{status_msg} | URL: {url_display}")
         if 'meta' in packed and packed['meta'].get('item_count'):
-            print(f"  -> {packed['meta']['item_count']} items")
+            logger.info(f"  -> {packed['meta']['item_count']} items")
     else:
-        print(f"{status_msg} | (duplicate/skipped)")
+        logger.info(f"{status_msg} | (duplicate/skipped)")
     return jsonify(result), (200 if result["ok"] else 500)
 
 
 # --- start ---
 if __name__ == "__main__":
-    # Kör i dev-läge. För produktion: kör via waitress/uvicorn etc.
-    # Windows 11-vänligt.
-    app.run(host="127.0.0.1", port=51234, debug=False)
+    # waitress (om installerat) ger en riktig trådpool; annars Flasks dev-server med trådar.
+    # Båda är Windows 11-vänliga. Delat tillstånd skyddas av INDEX_LOCK/LOG_LOCK.
+    threading.Thread(target=_flush_log_periodically, name="log-flush", daemon=True).start()
+    try:
+        from waitress import serve
+    except ImportError:
+        serve = None
+
+    if serve is not None:
+        logger.info("[SERVER] Startar med waitress (8 trådar) på 127.0.0.1:51234")
+        serve(app, host="127.0.0.1", port=51234, threads=8, connection_limit=200)
+    else:
+        app.run(host="127.0.0.1", port=51234, debug=False, threaded=True)
@@ -7,13 +7,108 @@ from pathlib import Path
 from enum import Enum
 from typing import Optional
 
-from playwright.async_api import async_playwright
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
 
 BASE_URL = "https://poit.bolagsverket.se"
+CDP_URL = "http://127.0.0.1:9222"
 
-# CAPTCHA backoff state (shared between calls)
-_captcha_backoff_seconds = 0
-_captcha_count = 0
+# Resources not needed to read body.innerText.
+# Stylesheets are let through - the cookie-banner is_visible() check relies on CSS.
+BLOCKED_RESOURCE_TYPES = frozenset({"image", "font", "media"})
+BLOCKED_HOSTS = (
+    "google-analytics.com",
+    "googletagmanager.com",
+    "doubleclick.net",
+    "siteimproveanalytics",
+)
+
+# Text that marks a page with actual kungörelse content
+CONTENT_MARKERS = ("Kungörelsetext", "Org nr:", "Registreringsdatum")
+
+# Evaluated in the page with CONTENT_MARKERS: does it contain actual kungörelse content?
+CONTENT_CHECK_JS = """(markers) => {
+    const t = (document.body && document.body.innerText) || '';
+    const ok = t.length > 500 && markers.some((m) => t.includes(m));
+    return {ok: ok, len: t.length};
+}"""
+
+# Pages with less body text than this are treated as error pages
+ERROR_PAGE_MAX_CHARS = 200
+
+# Evaluated in the page: has the body rendered enough text to inspect?
+CONTENT_READY_JS = "() => document.body && document.body.innerText.length > 500"
+
+# Evaluated in the page: already rendered body text, enough to classify the page.
+# Long pages return head + tail - cookie banners and overlays are usually
+# appended at the end of <body> and would fall outside a head-only slice.
+DETECT_TEXT_JS = """() => {
+    const t = document.body ? document.body.innerText : '';
+    return t.length <= 16000 ? t : t.slice(0, 8000) + '\\n' + t.slice(-8000);
+}"""
+
+# Lowercase page-text indicators for detect_block_reason()
+COOKIE_INDICATORS = (
+    "acceptera cookies",
+    "vi använder cookies",
+    "cookie policy",
+    "godkänn cookies",
+    "accept all cookies",
+)
+COOKIE_BANNER_SELECTORS = (
+    '[data-cf-action="accept"]',
+    '.cookie-banner',
+    '#cookie-banner',
+    '.consent-banner',
+    '[class*="cookie"]',
+)
+RATE_LIMIT_INDICATORS = (
+    "rate limit",
+    "too many requests",
+    "429",
+    "för många förfrågningar",
+    "vänta en stund",
+    "try again later",
+)
+CAPTCHA_INDICATORS = (
+    "human visitor",
+    "captcha",
+    "verify you are human",
+    "robot",
+    "inte en robot",
+    "bekräfta att du",
+    "recaptcha",
+    "hcaptcha",
+)
+ACCESS_DENIED_INDICATORS = (
+    "access denied",
+    "åtkomst nekad",
+    "forbidden",
+    "403",
+    "behörighet saknas",
+    "inte behörig",
+)
+
+# Broader check used by detect_captcha() while waiting out a backoff
+CAPTCHA_WAIT_INDICATORS = (
+    "human visitor",
+    "captcha",
+    "verify you are human",
+    "robot",
+    "blocked",
+    "access denied",
+    "rate limit",
+)
+
+# Link from the "enskild" intermediate page to the actual kungörelse
+ENSKILD_LINK_SELECTORS = (
+    'a[href*="/kungorelse/K"]',
+    'a.btn-link[href*="/kungorelse"]',
+    'a[title="Visa kungörelse"]',
+)
+
+# Navigation: short timeout + retry instead of one long 30s wait
+GOTO_TIMEOUT_MS = 10000
+GOTO_ATTEMPTS = 3
 
 
 class BlockReason(Enum):
@@ -27,6 +122,18 @@ class BlockReason(Enum):
     UNKNOWN = "unknown"
 
 
+class CaptchaState:
+    """CAPTCHA backoff state shared by the tabs of one scrape run."""
+    
+    def __init__(self):
+        self.count = 0
+        self.backoff = 0
+        self.lock = asyncio.Lock()
+        # Cleared while one tab waits out a CAPTCHA - the other tabs pause on it
+        self.resolved = asyncio.Event()
+        self.resolved.set()
+
+
 async def detect_block_reason(page) -> BlockReason:
     """
     Detect WHY a page is blocked or needs intervention.
@@ -42,68 +149,28 @@ async def detect_block_reason(page) -> BlockReason:
         if "/enskild/" in url:
             return BlockReason.ENSKILD_PAGE
         
-        # Get page text for content analysis
-        text = await page.inner_text("body")
+        # Get page text for content analysis (rendered text, no locator wait)
+        text = await page.evaluate(DETECT_TEXT_JS)
         text_lower = text.lower()
         
         # Check for cookie banner (highest priority - easy to fix)
-        cookie_indicators = [
-            "acceptera cookies",
-            "vi använder cookies",
-            "cookie policy",
-            "godkänn cookies",
-            "accept all cookies",
-        ]
-        if any(ind in text_lower for ind in cookie_indicators):
+        if any(ind in text_lower for ind in COOKIE_INDICATORS):
             # Verify banner is actually visible
-            banner_selectors = [
-                '[data-cf-action="accept"]',
-                '.cookie-banner',
-                '#cookie-banner',
-                '.consent-banner',
-                '[class*="cookie"]',
-            ]
-            for sel in banner_selectors:
+            for sel in COOKIE_BANNER_SELECTORS:
                 elem = await page.query_selector(sel)
                 if elem and await elem.is_visible():
                     return BlockReason.COOKIE_BANNER
         
         # Check for rate limiting (second priority - need to wait)
-        rate_limit_indicators = [
-            "rate limit",
-            "too many requests",
-            "429",
-            "för många förfrågningar",
-            "vänta en stund",
-            "try again later",
-        ]
-        if any(ind in text_lower for ind in rate_limit_indicators):
+        if any(ind in text_lower for ind in RATE_LIMIT_INDICATORS):
             return BlockReason.RATE_LIMITED
         
         # Check for CAPTCHA (third priority - need user intervention or wait)
-        captcha_indicators = [
-            "human visitor",
-            "captcha",
-            "verify you are human",
-            "robot",
-            "inte en robot",
-            "bekräfta att du",
-            "recaptcha",
-            "hcaptcha",
-        ]
-        if any(ind in text_lower for ind in captcha_indicators):
+        if any(ind in text_lower for ind in CAPTCHA_INDICATORS):
             return BlockReason.CAPTCHA
         
         # Check for access denied (might need re-login)
-        access_indicators = [
-            "access denied",
-            "åtkomst nekad",
-            "forbidden",
-            "403",
-            "behörighet saknas",
-            "inte behörig",
-        ]
-        if any(ind in text_lower for ind in access_indicators):
+        if any(ind in text_lower for ind in ACCESS_DENIED_INDICATORS):
             return BlockReason.ACCESS_DENIED
         
         return BlockReason.NONE
@@ -150,73 +217,81 @@ async def handle_cookie_banner(page, wait_after: int = 3) -> bool:
     return False
 
 
-async def get_cookies_from_chrome(cookie_wait: int = 10) -> dict:
+async def connect_to_chrome(playwright):
+    """
+    Connect to the running Chrome via CDP.
+    
+    Call once per run and pass the returned context to get_cookies_from_chrome()
+    and scrape_kungorelse_pages(), so both share one CDP connection.
+    
+    Args:
+        playwright: Started Playwright instance.
+    
+    Returns:
+        The default browser context (the user's Chrome profile).
+    """
+    try:
+        browser = await playwright.chromium.connect_over_cdp(CDP_URL)
+    except Exception as e:
+        print(f"    ❌ Kunde inte ansluta till Chrome på port 9222!")
+        print(f"    Kontrollera att:")
+        print(f"      1. Chrome körs med --remote-debugging-port=9222")
+        print(f"      2. Ingen annan process använder port 9222")
+        print(f"      3. Du inte har flera Chrome-instanser igång")
+        raise ConnectionError(f"Chrome CDP connection failed: {e}")
+    
+    return browser.contexts[0]
+
+
+async def get_cookies_from_chrome(context, cookie_wait: int = 10) -> dict:
     """
-    Connect to Chrome via CDP and extract cookies.
+    Extract cookies from an already connected Chrome context.
     Handles cookie banner, CAPTCHA, and rate limiting automatically.
     
     Args:
+        context: Playwright browser context from connect_to_chrome().
         cookie_wait: Seconds to wait after clicking cookie banner.
     
     Returns:
         Dictionary of cookies for bolagsverket.se domain.
     """
     try:
-        async with async_playwright() as p:
-            try:
-                browser = await p.chromium.connect_over_cdp("http://127.0.0.1:9222")
-            except Exception as e:
-                print(f"    ❌ Kunde inte ansluta till Chrome på port 9222!")
-                print(f"    Kontrollera att:")
-                print(f"      1. Chrome körs med --remote-debugging-port=9222")
-                print(f"      2. Ingen annan process använder port 9222")
-                print(f"      3. Du inte har flera Chrome-instanser igång")
-                raise ConnectionError(f"Chrome CDP connection failed: {e}")
-            
-            context = browser.contexts[0]
-            page = context.pages[0] if context.pages else await context.new_page()
-            
-            # Make sure we're on the right site
-            if "poit.bolagsverket.se" not in page.url:
-                await page.goto(f"{BASE_URL}/poit-app/", wait_until="domcontentloaded")
-                await asyncio.sleep(3)
-            
-            # Detect what's blocking us (if anything)
-            block_reason = await detect_block_reason(page)
-            
-            if block_reason == BlockReason.COOKIE_BANNER:
-                print(f"    🍪 Cookie-banner upptäckt")
-                if await handle_cookie_banner(page, wait_after=cookie_wait):
-                    print(f"    ✓ Cookie-banner hanterad")
-                    # Re-check after handling
-                    block_reason = await detect_block_reason(page)
-            
-            if block_reason == BlockReason.RATE_LIMITED:
-                print(f"    ⏱️  RATE LIMITED - Väntar 60s...")
-                await asyncio.sleep(60)
-                await page.reload()
-                await asyncio.sleep(5)
+        page = context.pages[0] if context.pages else await context.new_page()
+        
+        # Make sure we're on the right site
+        if "poit.bolagsverket.se" not in page.url:
+            await page.goto(f"{BASE_URL}/poit-app/", wait_until="domcontentloaded")
+            await asyncio.sleep(3)
+        
+        # Detect what's blocking us (if anything)
+        block_reason = await detect_block_reason(page)
+        
+        if block_reason == BlockReason.COOKIE_BANNER:
+            print(f"    🍪 Cookie-banner upptäckt")
+            if await handle_cookie_banner(page, wait_after=cookie_wait):
+                print(f"    ✓ Cookie-banner hanterad")
+                # Re-check after handling
                 block_reason = await detect_block_reason(page)
-            
-            if block_reason == BlockReason.CAPTCHA:
-                print(f"    🤖 CAPTCHA upptäckt")
-                await handle_captcha_backoff(page, context)
-            
-            if block_reason == BlockReason.ACCESS_DENIED:
-                print(f"    🚫 ÅTKOMST NEKAD - Du kan behöva logga in igen")
-                print(f"    Öppna Chrome och navigera till sajten manuellt.")
-            
-            # Get all cookies
-            cookies = await context.cookies()
-            cookie_dict = {}
-            for c in cookies:
-                if "bolagsverket" in c.get("domain", ""):
-                    cookie_dict[c["name"]] = c["value"]
-            
-            return cookie_dict
-            
-    except ConnectionError:
-        raise
+        
+        if block_reason == BlockReason.RATE_LIMITED:
+            print(f"    ⏱️  RATE LIMITED - Väntar 60s...")
+            await asyncio.sleep(60)
+            await page.reload()
+            await asyncio.sleep(5)
+            block_reason = await detect_block_reason(page)
+        
+        if block_reason == BlockReason.CAPTCHA:
+            print(f"    🤖 CAPTCHA upptäckt")
+            await handle_captcha_backoff(page, context)
+        
+        if block_reason == BlockReason.ACCESS_DENIED:
+            print(f"    🚫 ÅTKOMST NEKAD - Du kan behöva logga in igen")
+            print(f"    Öppna Chrome och navigera till sajten manuellt.")
+        
+        # Only cookies for the site - Playwright filters by URL, not the whole profile
+        cookies = await context.cookies([BASE_URL, f"{BASE_URL}/poit-app/"])
+        return {c["name"]: c["value"] for c in cookies}
+        
     except Exception as e:
         print(f"    [COOKIE ERROR] {e}")
         return {}
@@ -225,44 +300,41 @@ async def get_cookies_from_chrome(cookie_wait: int = 10) -> dict:
 async def detect_captcha(page) -> bool:
     """Check if page shows a CAPTCHA challenge."""
     try:
-        text = await page.inner_text("body")
+        text = await page.evaluate(DETECT_TEXT_JS)
         text_lower = text.lower()
-        captcha_indicators = [
-            "human visitor",
-            "captcha",
-            "verify you are human",
-            "robot",
-            "blocked",
-            "access denied",
-            "rate limit",
-        ]
-        return any(indicator in text_lower for indicator in captcha_indicators)
+        return any(indicator in text_lower for indicator in CAPTCHA_WAIT_INDICATORS)
     except Exception:
         return False
 
 
-async def handle_captcha_backoff(page, context) -> bool:
+async def handle_captcha_backoff(page, context, state: Optional[CaptchaState] = None) -> bool:
     """
     Handle CAPTCHA with exponential backoff.
     Returns True if user resolved CAPTCHA, False to abort.
-    """
-    global _captcha_backoff_seconds, _captcha_count
     
-    _captcha_count += 1
+    Pass the same CaptchaState for all pages in a run so the backoff keeps
+    growing across tabs; without one, a fresh state (30s) is used.
+    """
+    if state is None:
+        state = CaptchaState()
     
-    # Exponential backoff: 30s, 60s, 120s, 240s...
-    if _captcha_backoff_seconds == 0:
-        _captcha_backoff_seconds = 30
-    else:
-        _captcha_backoff_seconds = min(_captcha_backoff_seconds * 2, 300)  # Max 5 min
+    async with state.lock:
+        state.count += 1
+        
+        # Exponential backoff: 30s, 60s, 120s, 240s...
+        if state.backoff == 0:
+            state.backoff = 30
+        else:
+            state.backoff = min(state.backoff * 2, 300)  # Max 5 min
+        count, backoff = state.count, state.backoff
     
-    print(f"\n    ⚠️  CAPTCHA UPPTÄCKT! (gång {_captcha_count})")
+    print(f"\n    ⚠️  CAPTCHA UPPTÄCKT! (gång {count})")
     print(f"    ╔════════════════════════════════════════════════════╗")
     print(f"    ║  Bolagsverket kräver verifiering.                  ║")
     print(f"    ║                                                    ║")
     print(f"    ║  Alternativ:                                       ║")
     print(f"    ║  1. Lös CAPTCHA i Chrome-fönstret                  ║")
-    print(f"    ║  2. Vänta {_captcha_backoff_seconds:3}s (automatisk backoff)               ║")
+    print(f"    ║  2. Vänta {backoff:3}s (automatisk backoff)               ║")
     print(f"    ║                                                    ║")
     print(f"    ║  Tryck ENTER när du löst CAPTCHA, eller vänta...   ║")
     print(f"    ╚════════════════════════════════════════════════════╝")
@@ -271,25 +343,80 @@ async def handle_captcha_backoff(page, context) -> bool:
     import sys
     import select
     
-    for remaining in range(_captcha_backoff_seconds, 0, -1):
+    for remaining in range(backoff, 0, -1):
         print(f"\r    Väntar... {remaining:3}s (tryck ENTER om löst) ", end="", flush=True)
         await asyncio.sleep(1)
         
         # Check if CAPTCHA is gone (user solved it)
         if not await detect_captcha(page):
             print(f"\n    ✅ CAPTCHA löst! Fortsätter...")
-            _captcha_backoff_seconds = max(30, _captcha_backoff_seconds // 2)  # Reduce backoff
+            async with state.lock:
+                state.backoff = max(30, state.backoff // 2)  # Reduce backoff
             return True
     
     print(f"\n    Backoff klar. Testar igen...")
     return True
 
 
+async def _block_unneeded_resources(route):
+    """Route handler: abort images/fonts/media and tracker requests."""
+    request = route.request
+    if request.resource_type in BLOCKED_RESOURCE_TYPES or any(
+        host in request.url for host in BLOCKED_HOSTS
+    ):
+        await route.abort()
+    else:
+        await route.continue_()
+
+
+def _write_content(
+    kung_folder: Path, url: str, title: str, timestamp: str, text_content: str
+) -> None:
+    """Write content.txt for one kungörelse (blocking - run via asyncio.to_thread)."""
+    kung_folder.mkdir(parents=True, exist_ok=True)
+    with open(kung_folder / "content.txt", "w", encoding="utf-8") as f:
+        f.write(f"URL: {url}\n")
+        f.write(f"Title: {title}\n")
+        f.write(f"Timestamp: {timestamp}\n")
+        f.write("=" * 60 + "\n\n")
+        f.write(text_content)
+
+
+async def wait_for_content(page, max_wait: float) -> None:
+    """Wait until the page body has rendered text, at most max_wait seconds."""
+    try:
+        await page.wait_for_function(CONTENT_READY_JS, timeout=max_wait * 1000)
+    except PlaywrightTimeoutError:
+        pass
+
+
+async def goto_with_retry(page, url: str) -> None:
+    """
+    Navigate with a short timeout and retry on timeout.
+    
+    Retries use wait_until="commit" so they return as soon as headers arrive;
+    the caller's own wait lets the JavaScript finish rendering.
+    """
+    for attempt in range(GOTO_ATTEMPTS):
+        try:
+            await page.goto(
+                url,
+                wait_until="domcontentloaded" if attempt == 0 else "commit",
+                timeout=GOTO_TIMEOUT_MS,
+            )
+            return
+        except PlaywrightTimeoutError:
+            if attempt == GOTO_ATTEMPTS - 1:
+                raise
+            await asyncio.sleep(2 ** attempt)
+
+
 async def scrape_single_page(
     context, 
     kung_id: str, 
     output_folder: Path, 
-    wait_range: tuple
+    wait_range: tuple,
+    captcha_state: Optional[CaptchaState] = None
 ) -> dict:
     """
     Scrape a single kungörelse page.
@@ -299,12 +426,11 @@ async def scrape_single_page(
         kung_id: Kungörelse ID (e.g., "K966433/25").
         output_folder: Path to save output files.
         wait_range: Tuple of (min, max) seconds to wait for page load.
+        captcha_state: CAPTCHA backoff state shared with the other tabs.
     
     Returns:
         Result dictionary with 'id', 'success', and optionally 'chars' or 'error'.
     """
-    global _captcha_backoff_seconds
-    
     normalized_id = kung_id.replace("/", "-")
     url = f"{BASE_URL}/poit-app/kungorelse/{normalized_id}"
     result = {"id": kung_id, "success": False, "block_reason": None}
@@ -312,12 +438,15 @@ async def scrape_single_page(
     page = await context.new_page()
     
     try:
-        await page.goto(url, wait_until="domcontentloaded", timeout=30000)
+        # Don't navigate into a CAPTCHA another tab is already handling
+        if captcha_state:
+            await captcha_state.resolved.wait()
+        await goto_with_retry(page, url)
         
-        # VIKTIGT: Vänta 4-5 sekunder FÖRST för att simulera mänskligt beteende
-        # och låta Bolagsverkets JavaScript ladda klart
+        # VIKTIGT: Låt Bolagsverkets JavaScript ladda klart innan vi kollar sidan.
+        # Väntan avbryts så fort innehållet renderats (max 4-5.5s)
         initial_wait = random.uniform(4.0, 5.5)
-        await asyncio.sleep(initial_wait)
+        await wait_for_content(page, initial_wait)
         
         # Check what's blocking us (more specific than just CAPTCHA)
         block_reason = await detect_block_reason(page)
@@ -334,10 +463,20 @@ async def scrape_single_page(
             return result
         
         if block_reason == BlockReason.CAPTCHA:
-            await handle_captcha_backoff(page, context)
+            if captcha_state is None or captcha_state.resolved.is_set():
+                # First tab to hit it runs the backoff, the others pause
+                if captcha_state:
+                    captcha_state.resolved.clear()
+                try:
+                    await handle_captcha_backoff(page, context, captcha_state)
+                finally:
+                    if captcha_state:
+                        captcha_state.resolved.set()
+            else:
+                await captcha_state.resolved.wait()
             # Retry the page after backoff
-            await page.goto(url, wait_until="domcontentloaded", timeout=30000)
-            await asyncio.sleep(initial_wait)
+            await goto_with_retry(page, url)
+            await wait_for_content(page, initial_wait)
             block_reason = await detect_block_reason(page)
         
         if block_reason == BlockReason.ACCESS_DENIED:
@@ -345,9 +484,8 @@ async def scrape_single_page(
             result["block_reason"] = "access_denied"
             return result
         
-        # Extra wait for JavaScript to render content
-        wait_time = random.uniform(*wait_range)
-        await asyncio.sleep(wait_time)
+        # Extra wait for JavaScript to render content (returns early once rendered)
+        await wait_for_content(page, random.uniform(*wait_range))
         
         # Handle "enskild" intermediate page (redirect page)
         max_retries = 3
@@ -359,13 +497,13 @@ async def scrape_single_page(
                 await asyncio.sleep(random.uniform(2, 3))
                 
                 # Re-check if still on enskild
-                if "/enskild/" in page.url:
-                    # Try clicking through to actual kungörelse
-                    link = await page.query_selector('a[href*="/kungorelse/K"]')
-                    if not link:
-                        link = await page.query_selector('a.btn-link[href*="/kungorelse"]')
-                    if not link:
-                        link = await page.query_selector('a[title="Visa kungörelse"]')
+                if "/enskild/" in page.url.lower():
+                    # Try clicking through to actual kungörelse (selectors in priority order)
+                    link = None
+                    for selector in ENSKILD_LINK_SELECTORS:
+                        link = await page.query_selector(selector)
+                        if link:
+                            break
                     
                     if link:
                         await link.click()
@@ -386,41 +524,37 @@ async def scrape_single_page(
         
         # Also handle case where we land on main page (not kungorelse)
         current_url = page.url
-        if current_url.endswith("/poit-app/") or current_url.endswith("/poit-app"):
+        url_l = current_url.lower()
+        if url_l.endswith("/poit-app/") or url_l.endswith("/poit-app"):
             # We got redirected to main page - try direct navigation again
-            await page.goto(url, wait_until="domcontentloaded", timeout=30000)
-            await asyncio.sleep(random.uniform(*wait_range))
+            await goto_with_retry(page, url)
+            await wait_for_content(page, random.uniform(*wait_range))
             current_url = page.url
+            url_l = current_url.lower()
         
         # Verify we're on the actual kungörelse page (not enskild)
-        if "/kungorelse/" in current_url and "/enskild/" not in current_url:
-            text_content = await page.inner_text("body")
-            title = await page.title()
+        if "/kungorelse/" in url_l and "/enskild/" not in url_l:
+            # Check for actual kungörelse content in the browser first, so
+            # wrong/empty pages don't ship the whole body over CDP
+            check = await page.evaluate(CONTENT_CHECK_JS, list(CONTENT_MARKERS))
             
-            # Check for actual kungörelse content
-            has_content = any([
-                "Kungörelsetext" in text_content,
-                "Org nr:" in text_content,
-                "Registreringsdatum" in text_content
-            ])
-            
-            if has_content and len(text_content) > 500:
-                # Save to output folder
-                kung_folder = output_folder / normalized_id
-                kung_folder.mkdir(parents=True, exist_ok=True)
+            if check["ok"]:
+                text_content = await page.inner_text("body")
+                title = await page.title()
                 
+                # Save only content.txt (off the event loop)
+                kung_folder = output_folder / normalized_id
                 timestamp = datetime.now().isoformat()
-                
-                # Save only content.txt
-                with open(kung_folder / "content.txt", "w", encoding="utf-8") as f:
-                    f.write(f"URL: {current_url}\n")
-                    f.write(f"Title: {title}\n")
-                    f.write(f"Timestamp: {timestamp}\n")
-                    f.write("=" * 60 + "\n\n")
-                    f.write(text_content)
+                await asyncio.to_thread(
+                    _write_content, kung_folder, current_url, title, timestamp, text_content
+                )
                 
                 result["success"] = True
                 result["chars"] = len(text_content)
+            elif check["len"] < ERROR_PAGE_MAX_CHARS:
+                # Near-empty body - an error page; its title says more than the text
+                title = await page.title()
+                result["error"] = f"Felsida: {title[:40]}" if title else "Inget innehåll"
             else:
                 result["error"] = "Inget innehåll"
         else:
@@ -436,6 +570,7 @@ async def scrape_single_page(
 
 
 async def scrape_kungorelse_pages(
+    context,
     kung_ids: list, 
     output_folder: Path, 
     parallel: int = 1,
@@ -446,6 +581,7 @@ async def scrape_kungorelse_pages(
     Scrape multiple kungörelse pages.
     
     Args:
+        context: Playwright browser context from connect_to_chrome().
         kung_ids: List of kungörelse IDs to scrape.
         output_folder: Path to save output files.
         parallel: Number of parallel tabs (1 = sequential, safest).
@@ -457,48 +593,55 @@ async def scrape_kungorelse_pages(
     """
     results = []
     total = len(kung_ids)
+    captcha_state = CaptchaState()
     
     try:
-        async with async_playwright() as p:
-            browser = await p.chromium.connect_over_cdp("http://127.0.0.1:9222")
-            context = browser.contexts[0]
+        await context.route("**/*", _block_unneeded_resources)
+        
+        for i in range(0, total, parallel):
+            batch = kung_ids[i:i + parallel]
+            batch_num = i // parallel + 1
+            total_batches = (total + parallel - 1) // parallel
+            print(f"\n    Batch {batch_num}/{total_batches}: {len(batch)} sida(or)...")
             
-            for i in range(0, total, parallel):
-                batch = kung_ids[i:i + parallel]
-                batch_num = i // parallel + 1
-                total_batches = (total + parallel - 1) // parallel
-                print(f"\n    Batch {batch_num}/{total_batches}: {len(batch)} sida(or)...")
-                
-                # Staggered start for parallel tabs
-                async def scrape_delayed(kid, delay):
-                    await asyncio.sleep(delay)
-                    return await scrape_single_page(context, kid, output_folder, wait_range)
-                
-                tasks = [scrape_delayed(kid, j * 1.5) for j, kid in enumerate(batch)]
-                batch_results = await asyncio.gather(*tasks, return_exceptions=True)
-                
-                # Process results
-                for kid, r in zip(batch, batch_results):
-                    if isinstance(r, Exception):
-                        print(f"      ✗ {kid}: Error - {str(r)[:30]}")
-                        results.append({"id": kid, "success": False, "error": str(r)})
+            # Staggered start for parallel tabs
+            async def scrape_delayed(kid, delay):
+                await asyncio.sleep(delay)
+                return await scrape_single_page(
+                    context, kid, output_folder, wait_range, captcha_state
+                )
+            
+            tasks = [scrape_delayed(kid, j * 1.5) for j, kid in enumerate(batch)]
+            batch_results = await asyncio.gather(*tasks, return_exceptions=True)
+            
+            # Process results
+            for kid, r in zip(batch, batch_results):
+                if isinstance(r, Exception):
+                    print(f"      ✗ {kid}: Error - {str(r)[:30]}")
+                    results.append({"id": kid, "success": False, "error": str(r)})
+                else:
+                    status = "✓" if r["success"] else "✗"
+                    if r["success"]:
+                        info = f"{r.get('chars', 0)} tecken"
                     else:
-                        status = "✓" if r["success"] else "✗"
-                        if r["success"]:
-                            info = f"{r.get('chars', 0)} tecken"
-                        else:
-                            info = r.get("error", "Okänt fel")
-                        print(f"      {status} {kid}: {info}")
-                        results.append(r)
+                        info = r.get("error", "Okänt fel")
+                    print(f"      {status} {kid}: {info}")
+                    results.append(r)
+            
+            # Wait between batches (unless this is the last batch)
+            if i + parallel < total:
+                wait = random.uniform(*between_range)
+                print(f"    Väntar {wait:.1f}s...")
+                await asyncio.sleep(wait)
                 
-                # Wait between batches (unless this is the last batch)
-                if i + parallel < total:
-                    wait = random.uniform(*between_range)
-                    print(f"    Väntar {wait:.1f}s...")
-                    await asyncio.sleep(wait)
-                    
     except Exception as e:
         print(f"    [SCRAPER ERROR] {e}")
+    finally:
+        # The context is the user's Chrome profile - always remove the blocking again
+        try:
+            await context.unroute("**/*", _block_unneeded_resources)
+        except Exception:
+            pass
     
     return results
 
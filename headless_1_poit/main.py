@@ -22,16 +22,23 @@ import time
 from datetime import datetime
 from pathlib import Path
 
+try:
+    import orjson  # Optional: faster JSON serialization
+except ImportError:
+    orjson = None
+
 # Fix Windows encoding
 if sys.platform == "win32":
     import io
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8", errors="replace")
     sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding="utf-8", errors="replace")
 
+from playwright.async_api import async_playwright
+
 # Local imports
 from lib.chrome import start_chrome, stop_chrome
 from lib.api import create_session, fetch_kungorelser_list
-from lib.scraper import get_cookies_from_chrome, scrape_kungorelse_pages
+from lib.scraper import connect_to_chrome, get_cookies_from_chrome, scrape_kungorelse_pages
 
 # Paths
 SCRIPT_DIR = Path(__file__).parent.resolve()
@@ -39,6 +46,20 @@ OUTPUT_DIR = SCRIPT_DIR / "output"
 CONFIG_FILE = SCRIPT_DIR / "config.txt"
 
 
+# Key -> converter for each supported config.txt setting
+_CONFIG_SCHEMA = {
+    "count": int,
+    "date": str,
+    "parallel": int,
+    "visible": lambda v: v.lower() == "true",
+    "wait_min": int,
+    "wait_max": int,
+    "between_min": int,
+    "between_max": int,
+    "cookie_wait": int,
+}
+
+
 def load_config() -> dict:
     """Load configuration from config.txt."""
     config = {
@@ -53,26 +74,21 @@ def load_config() -> dict:
         "cookie_wait": 14,
     }
     
-    if CONFIG_FILE.exists():
-        with open(CONFIG_FILE, "r", encoding="utf-8") as f:
-            for line in f:
-                line = line.strip()
-                if not line or line.startswith("#"):
-                    continue
-                if "=" in line:
-                    key, value = line.split("=", 1)
-                    key = key.strip()
-                    value = value.strip()
-                    if key in config:
-                        if key == "visible":
-                            config[key] = value.lower() == "true"
-                        elif key == "date":
-                            config[key] = value
-                        else:
-                            try:
-                                config[key] = int(value) if value else config[key]
-                            except ValueError:
-                                pass
+    if not CONFIG_FILE.exists():
+        return config
+    
+    for line in CONFIG_FILE.read_text(encoding="utf-8").splitlines():
+        key, sep, value = line.partition("=")
+        key = key.strip()
+        if not sep or key.startswith("#") or key not in _CONFIG_SCHEMA:
+            continue
+        value = value.strip()
+        if not value and key != "date":
+            continue
+        try:
+            config[key] = _CONFIG_SCHEMA[key](value)
+        except ValueError:
+            pass
     return config
 
 
@@ -123,6 +139,7 @@ async def main():
     print_banner(config, date_str)
     
     chrome_proc = None
+    playwright = None
     
     try:
         # Step 1: Start Chrome
@@ -131,7 +148,10 @@ async def main():
         
         # Step 2: Get cookies from Chrome (handles cookie banner)
         print(f"\n[2/4] Hämtar cookies från Chrome...")
-        cookies = await get_cookies_from_chrome(cookie_wait=config["cookie_wait"])
+        # One CDP connection, shared by cookie extraction and scraping
+        playwright = await async_playwright().start()
+        context = await connect_to_chrome(playwright)
+        cookies = await get_cookies_from_chrome(context, cookie_wait=config["cookie_wait"])
         
         if not cookies:
             print("    ✗ Inga cookies! Kontrollera att Chrome körs korrekt.")
@@ -153,8 +173,11 @@ async def main():
         
         # Save the list
         list_file = output_folder / f"kungorelser_{date_str}.json"
-        with open(list_file, "w", encoding="utf-8") as f:
-            json.dump(kungorelser, f, ensure_ascii=False, indent=2)
+        if orjson is not None:
+            list_file.write_bytes(orjson.dumps(kungorelser, option=orjson.OPT_INDENT_2))
+        else:
+            with open(list_file, "w", encoding="utf-8") as f:
+                json.dump(kungorelser, f, ensure_ascii=False, indent=2)
         print(f"    Sparad: {list_file.name}")
         
         # Step 4: Scrape individual kungörelser
@@ -168,6 +191,7 @@ async def main():
         start_time = time.time()
         
         results = await scrape_kungorelse_pages(
+            context,
             to_scrape, 
             output_folder, 
             parallel=config["parallel"],
@@ -205,6 +229,8 @@ async def main():
         traceback.print_exc()
         return 1
     finally:
+        if playwright:
+            await playwright.stop()
         # Only auto-close Chrome if it's hidden
         if chrome_proc and not config["visible"]:
             stop_chrome(chrome_proc)
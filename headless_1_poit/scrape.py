@@ -8,12 +8,19 @@ the headless scraping and save results to 1_poit/info_server/.
 
 import asyncio
 import json
+import os
 import re
 import sys
 import time
+from dataclasses import asdict, dataclass, replace
 from datetime import datetime
 from pathlib import Path
 
+try:
+    import orjson  # Optional: faster JSON serialization
+except ImportError:
+    orjson = None
+
 # Fix Windows encoding
 if sys.platform == "win32":
     import io
@@ -54,6 +61,11 @@ LAGERBOLAG_PATTERNS = [
     re.compile(r"^[A-Za-zÅÄÖåäö]+\s+\d{4,6}\s+AB$", re.IGNORECASE),
 ]
 
+# Fused version of the above: one regex match per name instead of one per pattern
+_LAGERBOLAG_RE = re.compile(
+    "|".join(f"(?:{p.pattern})" for p in LAGERBOLAG_PATTERNS), re.IGNORECASE
+)
+
 
 def should_skip_company(name: str | None) -> bool:
     """
@@ -63,19 +75,28 @@ def should_skip_company(name: str | None) -> bool:
     if not isinstance(name, str) or not name:
         return False
     
+    # Check keywords - plain substring tests on one lowercased copy beat both a
+    # case-insensitive regex alternation and bytes.find here
     lowered = name.lower()
-    
-    # Check keywords
-    if any(keyword in lowered for keyword in NAME_EXCLUDE_KEYWORDS):
-        return True
-    
-    # Check lagerbolag patterns (e.g., "Startplattan 201499 Aktiebolag")
-    stripped = name.strip()
-    for pattern in LAGERBOLAG_PATTERNS:
-        if pattern.match(stripped):
+    for keyword in NAME_EXCLUDE_KEYWORDS:
+        if keyword in lowered:
             return True
     
-    return False
+    # Check lagerbolag patterns (e.g., "Startplattan 201499 Aktiebolag")
+    return _LAGERBOLAG_RE.match(name.strip()) is not None
+
+
+@dataclass(frozen=True, slots=True)
+class HeadlessConfig:
+    """Parsed scrape settings. Field defaults are the built-in defaults."""
+    parallel: int = 1
+    visible: bool = False
+    wait_min: int = 4
+    wait_max: int = 6
+    between_min: int = 2
+    between_max: int = 4
+    cookie_wait: int = 10
+    max_kun_dag: int | None = None  # From config_headless.txt
 
 
 def load_max_kun_dag() -> int | None:
@@ -99,7 +120,7 @@ def load_max_kun_dag() -> int | None:
     return None
 
 
-def load_config() -> dict:
+def load_config() -> HeadlessConfig:
     """
     Load configuration from environment variables, config.txt and config_headless.txt.
     
@@ -110,8 +131,6 @@ def load_config() -> dict:
         SCRAPE_BETWEEN_MIN, SCRAPE_BETWEEN_MAX - Wait between pages (seconds)
         SCRAPE_COOKIE_WAIT - Wait after cookie banner click (seconds)
     """
-    import os
-    
     # Try to load .env from project root
     try:
         from dotenv import load_dotenv
@@ -122,16 +141,7 @@ def load_config() -> dict:
         pass
     
     # Defaults
-    config = {
-        "parallel": 1,
-        "visible": False,
-        "wait_min": 4,
-        "wait_max": 6,
-        "between_min": 2,
-        "between_max": 4,
-        "cookie_wait": 10,
-        "max_kun_dag": None,  # From config_headless.txt
-    }
+    config = asdict(HeadlessConfig())
     
     # Load from config.txt (lower priority)
     if CONFIG_FILE.exists():
@@ -173,7 +183,15 @@ def load_config() -> dict:
     # Load MAX_KUN_DAG from config_headless.txt
     config["max_kun_dag"] = load_max_kun_dag()
     
-    return config
+    # Frozen - use dataclasses.replace() to override a field
+    return HeadlessConfig(**config)
+
+
+def _atomic_write_bytes(path: Path, data: bytes) -> None:
+    """Write via a temp file + rename so readers (server, pipeline) never see a partial file."""
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
 
 
 async def run_headless_scrape(
@@ -195,14 +213,15 @@ async def run_headless_scrape(
     # Import here to avoid circular imports
     from lib.chrome import start_chrome, stop_chrome
     from lib.api import create_session, fetch_kungorelser_list
-    from lib.scraper import get_cookies_from_chrome, scrape_kungorelse_pages
+    from lib.scraper import connect_to_chrome, get_cookies_from_chrome, scrape_kungorelse_pages
+    from playwright.async_api import async_playwright
     
     config = load_config()
     if visible:
-        config["visible"] = True
+        config = replace(config, visible=True)
     
     # Determine count: use argument > config_headless.txt > default 20
-    max_kun_dag = config.get("max_kun_dag")
+    max_kun_dag = config.max_kun_dag
     if count is None:
         count = max_kun_dag if max_kun_dag else 20
     elif max_kun_dag and count > max_kun_dag:
@@ -223,24 +242,28 @@ async def run_headless_scrape(
     print("=" * 60)
     print("HEADLESS SCRAPING")
     print("=" * 60)
-    print(f"  Datum:      {date_str[:4]}-{date_str[4:6]}-{date_str[6:8]}")
+    print(f"  Datum:      {api_date}")
     print(f"  Max antal:  {count} (från {count_source})")
     print(f"  Output:     {output_folder}")
-    print(f"  Chrome:     {'synlig' if config['visible'] else 'off-screen'}")
+    print(f"  Chrome:     {'synlig' if config.visible else 'off-screen'}")
     print("=" * 60)
     
     chrome_proc = None
+    playwright = None
     total_in_list = 0
     success_count = 0
     
     try:
         # Step 1: Start Chrome
         print(f"\n[HEADLESS 1/4] Startar Chrome...")
-        chrome_proc = start_chrome(visible=config["visible"])
+        chrome_proc = start_chrome(visible=config.visible)
         
         # Step 2: Get cookies
         print(f"\n[HEADLESS 2/4] Hämtar cookies från Chrome...")
-        cookies = await get_cookies_from_chrome(cookie_wait=config["cookie_wait"])
+        # One CDP connection, shared by cookie extraction and scraping
+        playwright = await async_playwright().start()
+        context = await connect_to_chrome(playwright)
+        cookies = await get_cookies_from_chrome(context, cookie_wait=config.cookie_wait)
         
         if not cookies:
             print("    ✗ Inga cookies! Kontrollera att Chrome körs.")
@@ -261,15 +284,21 @@ async def run_headless_scrape(
         print(f"    ✓ {total_in_list} kungörelser hittade")
         
         # Step 4: Filter and scrape individual pages
-        # First filter out holding companies, lagerbolag, etc. BEFORE scraping
+        # First filter out holding companies, lagerbolag, etc. BEFORE scraping,
+        # collecting the first `count` ids to scrape in the same pass
         filtered_kungorelser = []
+        to_scrape = []
         skipped_count = 0
+        skip = should_skip_company
         for k in kungorelser:
-            company_name = k.get("namn", "")
-            if should_skip_company(company_name):
+            if skip(k.get("namn", "")):
                 skipped_count += 1
-            else:
-                filtered_kungorelser.append(k)
+                continue
+            filtered_kungorelser.append(k)
+            if len(filtered_kungorelser) <= count:
+                kid = k.get("kungorelseid")
+                if kid:
+                    to_scrape.append(kid)
         
         if skipped_count > 0:
             print(f"    [FILTER] Hoppade över {skipped_count} holding/lagerbolag")
@@ -286,26 +315,24 @@ async def run_headless_scrape(
             },
             "data": filtered_kungorelser
         }
-        with open(list_file, "w", encoding="utf-8") as f:
-            json.dump(output_data, f, ensure_ascii=False, indent=2)
+        # Compact JSON - the file is only read by the pipeline
+        if orjson is not None:
+            list_bytes = orjson.dumps(output_data)
+        else:
+            list_bytes = json.dumps(output_data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        _atomic_write_bytes(list_file, list_bytes)
         print(f"    Sparad: {list_file.name} ({len(filtered_kungorelser)} företag efter filtrering)")
         
-        # Now create to_scrape list from filtered list
-        to_scrape = [
-            k.get("kungorelseid") 
-            for k in filtered_kungorelser[:count] 
-            if k.get("kungorelseid")
-        ]
-        
         print(f"\n[HEADLESS 4/4] Scraping {len(to_scrape)} kungörelser...")
         start_time = time.time()
         
         results = await scrape_kungorelse_pages(
+            context,
             to_scrape, 
             output_folder, 
-            parallel=config["parallel"],
-            wait_range=(config["wait_min"], config["wait_max"]),
-            between_range=(config["between_min"], config["between_max"])
+            parallel=config.parallel,
+            wait_range=(config.wait_min, config.wait_max),
+            between_range=(config.between_min, config.between_max)
         )
         
         elapsed = time.time() - start_time
@@ -334,7 +361,9 @@ async def run_headless_scrape(
         traceback.print_exc()
         return False, total_in_list, success_count
     finally:
-        if chrome_proc and not config["visible"]:
+        if playwright:
+            await playwright.stop()
+        if chrome_proc and not config.visible:
             stop_chrome(chrome_proc)
 
 
@@ -31,20 +31,35 @@ Kör i sekvens:
 """
 
 import asyncio
+import atexit
+import collections
 import configparser
+import http.client
 import json
 import os
 import random
 import re
 import shutil
+import socket
 import subprocess
 import sys
+import threading
 import time
+import traceback
+from calendar import monthrange
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import quote
 
-import pandas as pd
+try:
+    import orjson  # type: ignore
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+# orjson parsar bytes direkt (ingen avkodning); båda fel-typerna ärver ValueError
+_json_loads = orjson.loads if orjson is not None else json.loads
 
 # Encoding: PowerShell 7+ och Python 3.10+ har native UTF-8 stöd på Windows.
 # Ingen manuell wrapping behövs längre.
@@ -82,10 +97,15 @@ DROPBOX_DIR = PROJECT_ROOT / "9_dropbox"
 LOG_DIR = PROJECT_ROOT / "logs"
 STEP_LOG_DIR = LOG_DIR / "steps"
 RUN_LOG_FILE: Optional[Path] = None
+_RUN_LOG_FH = None  # Öppet filhandtag för RUN_LOG_FILE
+_RUN_LOG_LOCK = threading.Lock()  # Delas med flush-tråden
+_RUN_LOG_LINES_SINCE_FLUSH = 0
+_RUN_LOG_FLUSHER: Optional[threading.Thread] = None
 RUN_TS: str = ""
 
 # Lock file to prevent concurrent pipeline runs
 PIPELINE_LOCK_FILE = LOG_DIR / ".pipeline_lock"
+_PIPELINE_LOCK_HANDLE = None  # Öppen fil som håller OS-låset
 
 
 def ensure_log_dirs():
@@ -93,78 +113,178 @@ def ensure_log_dirs():
     STEP_LOG_DIR.mkdir(parents=True, exist_ok=True)
 
 
+def _lock_file_handle(handle) -> bool:
+    """Ta ett exklusivt OS-lås (icke-blockerande) på en öppen fil. True om låset togs."""
+    try:
+        if sys.platform == "win32":
+            import msvcrt
+
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except OSError:
+        return False
+
+
 def acquire_pipeline_lock() -> bool:
     """
     Försök skaffa pipeline-lock. Returnerar True om lock kunde skaffas, False annars.
+
+    Låset är ett OS-lås (fcntl/msvcrt) på lock-filen som hålls öppen under hela
+    körningen. Det släpps automatiskt när processen dör - ingen stale-heuristik behövs.
     """
+    global _PIPELINE_LOCK_HANDLE
     ensure_log_dirs()
-    
-    if PIPELINE_LOCK_FILE.exists():
-        # Kolla om lock-filen är gammal (mer än 2 timmar = troligen stuck process)
-        lock_age = time.time() - PIPELINE_LOCK_FILE.stat().st_mtime
-        if lock_age > 7200:  # 2 timmar
-            log_warn(f"⚠️  Gammal lock-fil hittades ({lock_age/3600:.1f} timmar gammal) - tar bort den")
-            try:
-                PIPELINE_LOCK_FILE.unlink()
-            except Exception as e:
-                log_error(f"Kunde inte ta bort gammal lock-fil: {e}")
-                return False
-        else:
-            # Läs lock-info om den finns
-            try:
-                lock_info = PIPELINE_LOCK_FILE.read_text(encoding="utf-8").strip()
-                log_error("=" * 60)
-                log_error("🚫 PIPELINE REDAN KÖRS!")
-                log_error("=" * 60)
-                log_error(f"En annan pipeline-körning pågår redan.")
-                if lock_info:
-                    log_error(f"Lock-info: {lock_info}")
-                log_error("")
-                log_error("Vänta tills den andra körningen är klar, eller:")
-                log_error(f"  - Ta bort lock-filen manuellt: {PIPELINE_LOCK_FILE}")
-                log_error("  - Eller vänta 2 timmar (lock-filen tas bort automatiskt)")
-                log_error("=" * 60)
-            except Exception:
-                pass
-            return False
-    
-    # Skapa lock-fil med info om denna körning
+
     try:
-        lock_info = f"Started: {datetime.now().isoformat()}\nPID: {os.getpid()}\nCommand: {' '.join(sys.argv)}"
-        PIPELINE_LOCK_FILE.write_text(lock_info, encoding="utf-8")
-        return True
+        handle = open(PIPELINE_LOCK_FILE, "a+", encoding="utf-8")
     except Exception as e:
-        log_error(f"Kunde inte skapa lock-fil: {e}")
+        log_error(f"Kunde inte öppna lock-fil: {e}")
         return False
 
+    if not _lock_file_handle(handle):
+        # Läs lock-info om den finns (kan vara spärrad på Windows)
+        lock_info = ""
+        try:
+            handle.seek(0)
+            lock_info = handle.read().strip()
+        except Exception:
+            pass
+        handle.close()
+        log_error(_BAR)
+        log_error("🚫 PIPELINE REDAN KÖRS!")
+        log_error(_BAR)
+        log_error(f"En annan pipeline-körning pågår redan.")
+        if lock_info:
+            log_error(f"Lock-info: {lock_info}")
+        log_error("")
+        log_error("Vänta tills den andra körningen är klar")
+        log_error("(låset släpps automatiskt när den processen avslutas).")
+        log_error(_BAR)
+        return False
+
+    # Skriv info om denna körning (endast för diagnostik)
+    try:
+        handle.seek(0)
+        handle.truncate()
+        handle.write(
+            f"Started: {datetime.now().isoformat()}\nPID: {os.getpid()}\nCommand: {' '.join(sys.argv)}"
+        )
+        handle.flush()
+    except Exception as e:
+        log_warn(f"Kunde inte skriva lock-info: {e}")
+
+    _PIPELINE_LOCK_HANDLE = handle
+    return True
+
 
 def release_pipeline_lock():
-    """Ta bort pipeline-lock."""
+    """Släpp pipeline-lock."""
+    global _PIPELINE_LOCK_HANDLE
+    handle = _PIPELINE_LOCK_HANDLE
+    if handle is None:
+        return
+    _PIPELINE_LOCK_HANDLE = None
     try:
-        if PIPELINE_LOCK_FILE.exists():
-            PIPELINE_LOCK_FILE.unlink()
+        if sys.platform == "win32":
+            import msvcrt
+
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
     except Exception as e:
-        log_warn(f"Kunde inte ta bort lock-fil: {e}")
+        log_warn(f"Kunde inte släppa lock: {e}")
+    finally:
+        handle.close()
 
 
 def setup_run_logging() -> Path:
     """Prepare per-run logging and return path to main log file."""
-    global RUN_LOG_FILE, RUN_TS
+    global RUN_LOG_FILE, RUN_TS, _RUN_LOG_FLUSHER
     RUN_TS = datetime.now().strftime("%Y%m%d_%H%M%S")
     ensure_log_dirs()
     RUN_LOG_FILE = LOG_DIR / f"main_{RUN_TS}.log"
-    RUN_LOG_FILE.write_text("", encoding="utf-8")
+    # Håll filen öppen hela körningen i stället för open/close per rad
+    _open_run_log("w")
+    if _RUN_LOG_FLUSHER is None:
+        _RUN_LOG_FLUSHER = threading.Thread(
+            target=_run_log_flush_loop, name="run-log-flush", daemon=True
+        )
+        _RUN_LOG_FLUSHER.start()
     return RUN_LOG_FILE
 
 
-def append_run_log(line: str):
+def _open_run_log(mode: str = "a"):
+    """(Åter)öppna run-loggen, t.ex. efter cleanup som kan ha raderat logs/main_*.log."""
+    global _RUN_LOG_FH, _RUN_LOG_LINES_SINCE_FLUSH
     if RUN_LOG_FILE is None:
         return
+    _close_run_log()
     try:
-        with RUN_LOG_FILE.open("a", encoding="utf-8") as f:
-            f.write(line + "\n")
-    except Exception:
-        pass
+        fh = RUN_LOG_FILE.open(mode, encoding="utf-8")
+    except OSError:
+        return
+    with _RUN_LOG_LOCK:
+        _RUN_LOG_FH = fh
+        _RUN_LOG_LINES_SINCE_FLUSH = 0
+
+
+def _close_run_log():
+    """Flusha och stäng run-loggen (registrerad med atexit)."""
+    global _RUN_LOG_FH
+    with _RUN_LOG_LOCK:
+        if _RUN_LOG_FH is None:
+            return
+        try:
+            _RUN_LOG_FH.close()
+        except Exception:
+            pass
+        _RUN_LOG_FH = None
+
+
+atexit.register(_close_run_log)
+
+
+def _run_log_flush_loop():
+    """Flusha run-loggen varje sekund även om inget nytt loggas (t.ex. vid häng)."""
+    global _RUN_LOG_LINES_SINCE_FLUSH
+    while True:
+        time.sleep(1.0)
+        with _RUN_LOG_LOCK:
+            if _RUN_LOG_FH is None or not _RUN_LOG_LINES_SINCE_FLUSH:
+                continue
+            try:
+                _RUN_LOG_FH.flush()
+            except Exception:
+                pass
+            _RUN_LOG_LINES_SINCE_FLUSH = 0
+
+
+def append_run_log(line: str):
+    global _RUN_LOG_LINES_SINCE_FLUSH
+    with _RUN_LOG_LOCK:
+        if _RUN_LOG_FH is None:
+            return
+        try:
+            _RUN_LOG_FH.write(line + "\n")
+            # Flusha var 64:e rad; flush-tråden tar resten inom en sekund
+            _RUN_LOG_LINES_SINCE_FLUSH += 1
+            if _RUN_LOG_LINES_SINCE_FLUSH >= 64:
+                _RUN_LOG_FH.flush()
+                _RUN_LOG_LINES_SINCE_FLUSH = 0
+        except Exception:
+            pass
+
+
+# Avdelare för rubriker i loggen
+_BAR = "=" * 60
 
 
 def ts() -> str:
@@ -184,120 +304,181 @@ def log_error(msg: str):
     append_run_log(line)
 
 
+def log_section(title: str):
+    """Logga en rubrik inramad av avdelare."""
+    log_info(_BAR)
+    log_info(title)
+    log_info(_BAR)
+
+
 def log_warn(msg: str):
     line = f"[WARN {ts()}] {msg}"
     print(line)
     append_run_log(line)
 
 
-def check_server_running() -> bool:
-    """Kontrollera om servern redan körs på PoIT-serverns port."""
+# Max väntetid på att en nystartad server öppnar porten (tidigare fast 5 + 2 s)
+SERVER_STARTUP_TIMEOUT = 7.0
+
+# Återanvänd anslutning för /health-anrop (keep-alive, stängs vid exit)
+_HEALTH_CONN: Optional[http.client.HTTPConnection] = None
+
+
+def _close_health_conn():
+    global _HEALTH_CONN
+    if _HEALTH_CONN is not None:
+        _HEALTH_CONN.close()
+        _HEALTH_CONN = None
+
+
+atexit.register(_close_health_conn)
+
+
+def _server_port_open(timeout: float = 0.2) -> bool:
+    """Snabb liveness-probe: lyssnar något på serverporten? (ingen HTTP)"""
     try:
-        import socket
-
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(1)
-        result = sock.connect_ex((POIT_SERVER_HOST, POIT_SERVER_PORT))
-        sock.close()
-        return result == 0
-    except Exception:
+        with socket.create_connection(
+            (POIT_SERVER_HOST, POIT_SERVER_PORT), timeout=timeout
+        ):
+            return True
+    except OSError:
         return False
 
 
-def start_server() -> Optional[subprocess.Popen]:
-    """Starta Flask-server i ett separat PowerShell-fönster."""
-    # Kontrollera om servern redan körs
-    if check_server_running():
-        log_info(f"Servern körs redan på port {POIT_SERVER_PORT} - använder den")
-        # Verifiera att servern faktiskt svarar på /health
-        try:
-            import urllib.request
+def check_server_health(timeout: float = 2) -> Optional[int]:
+    """
+    Gör en GET /health mot PoIT-servern över en återanvänd anslutning.
 
-            response = urllib.request.urlopen(f"{POIT_SERVER_BASE_URL}/health", timeout=2)
-            if response.getcode() == 200:
-                log_info("Servern svarar korrekt på /health")
+    Returns:
+        HTTP-statuskod, eller None om ingen server svarar på porten
+    """
+    global _HEALTH_CONN
+    for _ in range(2):
+        if _HEALTH_CONN is None:
+            _HEALTH_CONN = http.client.HTTPConnection(
+                POIT_SERVER_HOST, POIT_SERVER_PORT, timeout=timeout
+            )
+        conn = _HEALTH_CONN
+        reused = conn.sock is not None
+        if reused:
+            conn.sock.settimeout(timeout)
+        try:
+            conn.request("GET", "/health")
+            response = conn.getresponse()
+            response.read()  # Töm svaret så anslutningen kan återanvändas
+            return response.status
+        except (OSError, http.client.HTTPException):
+            _close_health_conn()
+            if not reused:
                 return None
-            else:
-                log_warn("Servern svarar men med fel statuskod")
-        except Exception as e:
-            log_warn(f"Servern körs men svarar inte på /health: {e}")
-        return None
+            # Servern stängde en vilande keep-alive-anslutning - försök en gång till
+    return None
 
-    log_info("Startar Flask-server i separat PowerShell-fönster...")
-    server_path = POIT_DIR / "server.py"
-    if not server_path.exists():
-        log_error(f"Server-fil saknas: {server_path}")
-        return None
 
-    try:
-        # Skicka med miljövariabler (inklusive TARGET_DATE om den är satt)
-        env = os.environ.copy()
-        if "TARGET_DATE" in env:
-            log_info(f"Skickar TARGET_DATE={env['TARGET_DATE']} till server-processen")
-
-        # Skapa PowerShell-kommando för att starta servern i nytt fönster
-        # Använd absolut sökväg för att säkerställa att det fungerar
-        python_exe = sys.executable
-        server_script = str(server_path)
-        cwd_path = str(POIT_DIR)
-
-        # Bygg PowerShell-kommando med korrekt escaping
-        # VIKTIGT: Använd $env: för att sätta miljövariabler som ärvs av Python-processen
-        env_setup = []
-        if "TARGET_DATE" in env:
-            target_date_value = env["TARGET_DATE"]
-            env_setup.append(f"$env:TARGET_DATE = '{target_date_value}'")
-        env_setup.append("$env:PYTHONIOENCODING = 'utf-8'")
-
-        # Skapa en temporär PowerShell-skriptfil för bättre kompatibilitet
-        # VIKTIGT: Sätt miljövariabler INNAN vi startar Python så de ärvs korrekt
-        ps_script_content = f"""
+# Återanvändbart launcher-skript för servern. Parametrarna skickas som -args
+# så skriptet skrivs bara om när innehållet ändrats (ingen tempfil per start).
+SERVER_LAUNCHER_PS1 = LOG_DIR / "run_server.ps1"
+_SERVER_LAUNCHER_SCRIPT = """param(
+    [string]$PythonExe,
+    [string]$ServerScript,
+    [string]$Cwd,
+    [string]$TargetDate = ""
+)
 Write-Host "========================================" -ForegroundColor Cyan
 Write-Host "FLASK SERVER - Startar..." -ForegroundColor Cyan
 Write-Host "========================================" -ForegroundColor Cyan
 # Sätt miljövariabler FÖRST - dessa kommer ärvas av Python-processen
-{chr(10).join(env_setup)}
+if ($TargetDate) {
+    $env:TARGET_DATE = $TargetDate
+}
+$env:PYTHONIOENCODING = 'utf-8'
 # Verifiera att miljövariablerna är satta
 Write-Host "Miljövariabler:" -ForegroundColor Yellow
-if ($env:TARGET_DATE) {{
+if ($env:TARGET_DATE) {
     Write-Host "  TARGET_DATE: $env:TARGET_DATE" -ForegroundColor Green
-}} else {{
+} else {
     Write-Host "  TARGET_DATE: EJ SATT" -ForegroundColor Red
-}}
+}
 Write-Host "  PYTHONIOENCODING: $env:PYTHONIOENCODING" -ForegroundColor Cyan
-Set-Location '{cwd_path}'
+Set-Location $Cwd
 Write-Host ""
-Write-Host "Python: {python_exe}" -ForegroundColor Yellow
-Write-Host "Script: {server_script}" -ForegroundColor Yellow
-Write-Host "Working Directory: {cwd_path}" -ForegroundColor Yellow
+Write-Host "Python: $PythonExe" -ForegroundColor Yellow
+Write-Host "Script: $ServerScript" -ForegroundColor Yellow
+Write-Host "Working Directory: $Cwd" -ForegroundColor Yellow
 Write-Host "========================================" -ForegroundColor Cyan
 Write-Host ""
 # Starta Python - miljövariablerna ärvs automatiskt från PowerShell-sessionen
-& '{python_exe}' '{server_script}'
+& $PythonExe $ServerScript
 Write-Host ""
 Write-Host "Server avslutad. Tryck valfri tangent för att stänga..." -ForegroundColor Red
 $null = $Host.UI.RawUI.ReadKey("NoEcho,IncludeKeyDown")
 """
 
-        # Spara till temporär fil
-        import tempfile
 
-        ps_script_file = tempfile.NamedTemporaryFile(
-            mode="w", suffix=".ps1", delete=False, encoding="utf-8"
+def _ensure_server_launcher() -> Path:
+    """Skriv launcher-skriptet till logs/ om det saknas eller är inaktuellt."""
+    ensure_log_dirs()
+    try:
+        if SERVER_LAUNCHER_PS1.read_text(encoding="utf-8-sig") == _SERVER_LAUNCHER_SCRIPT:
+            return SERVER_LAUNCHER_PS1
+    except (OSError, UnicodeDecodeError):
+        pass
+    # BOM så att Windows PowerShell 5 läser åäö korrekt
+    SERVER_LAUNCHER_PS1.write_text(_SERVER_LAUNCHER_SCRIPT, encoding="utf-8-sig")
+    return SERVER_LAUNCHER_PS1
+
+
+def start_server() -> Optional[subprocess.Popen]:
+    """Starta Flask-server i ett separat PowerShell-fönster."""
+    # Kontrollera om servern redan körs (en HTTP-förfrågan)
+    health_status = check_server_health()
+    if health_status is not None:
+        log_info(f"Servern körs redan på port {POIT_SERVER_PORT} - använder den")
+        if health_status == 200:
+            log_info("Servern svarar korrekt på /health")
+        else:
+            log_warn(f"Servern svarar men med fel statuskod ({health_status})")
+        return None
+    # Inget HTTP-svar - men om porten är öppen körs något redan där (t.ex. en
+    # server som hänger); starta inte en andra server mot en upptagen port
+    if _server_port_open():
+        log_warn(
+            f"Port {POIT_SERVER_PORT} är upptagen men /health svarar inte - startar ingen ny server"
         )
-        ps_script_file.write(ps_script_content)
-        ps_script_file.close()
-        ps_script_path = ps_script_file.name
+        return None
+
+    log_info("Startar Flask-server i separat PowerShell-fönster...")
+    server_path = POIT_DIR / "server.py"
+    if not server_path.exists():
+        log_error(f"Server-fil saknas: {server_path}")
+        return None
 
-        # Starta PowerShell i nytt fönster med skriptfilen
+    try:
+        # Skicka med TARGET_DATE (om den är satt) som parameter till launcher-skriptet
+        target_date_value = os.environ.get("TARGET_DATE")
+        if target_date_value is not None:
+            log_info(f"Skickar TARGET_DATE={target_date_value} till server-processen")
+
+        ps_script_path = _ensure_server_launcher()
+
+        # Starta PowerShell i nytt fönster med launcher-skriptet
+        # Använd absoluta sökvägar för att säkerställa att det fungerar
         ps_args = [
             "powershell.exe",
             "-NoExit",
             "-ExecutionPolicy",
             "Bypass",  # Tillåt körning av skript
             "-File",
-            ps_script_path,
+            str(ps_script_path),
+            "-PythonExe",
+            sys.executable,
+            "-ServerScript",
+            str(server_path),
+            "-Cwd",
+            str(POIT_DIR),
         ]
+        if target_date_value:
+            ps_args += ["-TargetDate", target_date_value]
 
         log_info("Öppnar nytt PowerShell-fönster för servern...")
         log_info(f"PowerShell-skript: {ps_script_path}")
@@ -311,21 +492,19 @@ $null = $Host.UI.RawUI.ReadKey("NoEcho,IncludeKeyDown")
             )
         except Exception as e:
             log_error(f"Kunde inte starta PowerShell: {e}")
-            # Rensa temporär fil
-            try:
-                os.unlink(ps_script_path)
-            except OSError:
-                pass
             return None
 
-        # Vänta på att servern startar
-        log_info("Väntar på server startup (5 sekunder)...")
-        time.sleep(5)
+        # Vänta på att servern startar: billig TCP-probe var 50:e ms i stället
+        # för fast sömn - /health anropas först när porten tar emot anslutningar
+        log_info(f"Väntar på server startup (upp till {SERVER_STARTUP_TIMEOUT:.0f} sekunder)...")
+        deadline = time.monotonic() + SERVER_STARTUP_TIMEOUT
+        while time.monotonic() < deadline:
+            if process.poll() is not None or _server_port_open():
+                break
+            time.sleep(0.05)
 
         # Kontrollera om processen fortfarande körs
         # OBS: PowerShell-processen kan fortfarande köra även om servern inte startat ännu
-        # Så vi väntar lite längre innan vi kontrollerar
-        time.sleep(2)
 
         if process.poll() is not None:
             exit_code = process.returncode
@@ -333,61 +512,34 @@ $null = $Host.UI.RawUI.ReadKey("NoEcho,IncludeKeyDown")
                 f"PowerShell-processen avslutades omedelbart (exit-kod {exit_code})"
             )
             log_error("Kontrollera PowerShell-fönstret för felmeddelanden")
-            # Rensa temporär fil
-            try:
-                os.unlink(ps_script_path)
-            except OSError:
-                pass
             return None
 
         # Verifiera att servern faktiskt svarar
         max_retries = 3
         for i in range(max_retries):
-            try:
-                import urllib.request
-
-                response = urllib.request.urlopen(
-                    f"{POIT_SERVER_BASE_URL}/health", timeout=2
+            if check_server_health() == 200:
+                log_info("Server startad och svarar korrekt på /health")
+                log_info(
+                    "Servern körs i separat PowerShell-fönster - låt den vara öppen!"
                 )
-                if response.getcode() == 200:
-                    log_info("Server startad och svarar korrekt på /health")
-                    log_info(
-                        "Servern körs i separat PowerShell-fönster - låt den vara öppen!"
-                    )
-                    return process
-            except Exception:
-                if i < max_retries - 1:
-                    log_info(
-                        f"Servern startar fortfarande, väntar... (försök {i + 1}/{max_retries})"
-                    )
-                    time.sleep(2)
-                else:
-                    log_error(
-                        "Servern startade men svarar inte på /health efter flera försök"
-                    )
-                    log_error("Kontrollera PowerShell-fönstret för felmeddelanden")
-                    # Rensa temporär fil
-                    try:
-                        os.unlink(ps_script_path)
-                    except OSError:
-                        pass
-                    # Försök inte stänga processen eftersom den körs i separat fönster
-                    return None
-
-        # Rensa temporär fil efter lyckad start
-        try:
-            # Vänta lite så PowerShell hinner läsa filen
-            time.sleep(1)
-            os.unlink(ps_script_path)
-        except OSError:
-            pass
+                return process
+            if i < max_retries - 1:
+                log_info(
+                    f"Servern startar fortfarande, väntar... (försök {i + 1}/{max_retries})"
+                )
+                time.sleep(2)
+            else:
+                log_error(
+                    "Servern startade men svarar inte på /health efter flera försök"
+                )
+                log_error("Kontrollera PowerShell-fönstret för felmeddelanden")
+                # Försök inte stänga processen eftersom den körs i separat fönster
+                return None
 
         return process
     except Exception as e:
         log_error(f"Kunde inte starta server: {e}")
-        import traceback
-
-        traceback.print_exc()
+        log_error(traceback.format_exc().rstrip())
         return None
 
 
@@ -396,7 +548,7 @@ def stop_server(process: Optional[subprocess.Popen]):
     if process is None:
         # Om process är None kan det betyda att servern redan körde när vi startade
         # eller att servern inte startades av oss. Kontrollera om servern fortfarande körs.
-        if check_server_running():
+        if check_server_health(timeout=1) is not None:
             log_info(
                 "Servern körs fortfarande (startades inte av oss) - låter den vara"
             )
@@ -410,14 +562,14 @@ def stop_server(process: Optional[subprocess.Popen]):
 
 def run_script(
     step_name: str, script_path: Path, cwd: Path = None
-) -> Tuple[int, float, Path, List[str]]:
+) -> Tuple[int, float, Path, "collections.deque[str]"]:
     """Kör ett Python-skript med loggning till fil. Returnerar (exit code, duration, logpath, tail_lines)."""
     if cwd is None:
         cwd = script_path.parent
 
     ensure_log_dirs()
     step_log = STEP_LOG_DIR / f"{step_name}_{RUN_TS}.log"
-    tail: List[str] = []
+    tail: "collections.deque[str]" = collections.deque(maxlen=25)
 
     target_date = os.environ.get("TARGET_DATE", "NOT_SET")
     log_info(
@@ -426,37 +578,58 @@ def run_script(
     start_time = time.time()
 
     try:
-        env = os.environ.copy()
-        with step_log.open("w", encoding="utf-8") as lf:
-            lf.write(f"[INFO {ts()}] Running {script_path} (cwd={cwd})\n")
-            lf.write(f"[INFO {ts()}] TARGET_DATE={target_date}\n")
+        with step_log.open("wb") as lf:
+            lf.write(f"[INFO {ts()}] Running {script_path} (cwd={cwd})\n".encode("utf-8"))
+            lf.write(f"[INFO {ts()}] TARGET_DATE={target_date}\n".encode("utf-8"))
             lf.flush()
 
+            # Binärläge: läs stora block och avkoda en gång per block i stället
+            # för radvis text-iteration (som avkodar och håller GIL per rad).
             process = subprocess.Popen(
                 [sys.executable, str(script_path)],
                 cwd=str(cwd),
-                env=env,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.STDOUT,
-                text=True,
-                encoding="utf-8",
-                errors="replace",
-                bufsize=1,
             )
 
             assert process.stdout is not None
-            for line in process.stdout:
-                clean = line.rstrip()
-                print(clean)
-                lf.write(clean + "\n")
-                lf.flush()
-                tail.append(clean)
-                if len(tail) > 25:
-                    tail.pop(0)
+            fd = process.stdout.fileno()
+            pending = b""
+            lines_since_flush = 0
+            while True:
+                # Flusha innan os.read kan blockera - ett barn som skriver och
+                # sedan står still ska synas i steg-loggen medan det står still.
+                # Ett block kan innehålla många rader, så det blir ändå inte per rad.
+                if lines_since_flush:
+                    lf.flush()
+                    lines_since_flush = 0
+                chunk = os.read(fd, 65536)
+                if not chunk:
+                    break
+                lines = (pending + chunk).split(b"\n")
+                pending = lines.pop()  # ofullständig sista rad
+                if not lines:
+                    continue
+                block = b"\n".join(line.rstrip() for line in lines) + b"\n"
+                lf.write(block)
+                lines_since_flush += len(lines)
+                text = block.decode("utf-8", errors="replace")
+                sys.stdout.write(text)
+                sys.stdout.flush()
+                tail.extend(text.splitlines()[-25:])
+            if pending:
+                block = pending.rstrip() + b"\n"
+                lf.write(block)
+                text = block.decode("utf-8", errors="replace")
+                sys.stdout.write(text)
+                tail.append(text.rstrip("\n"))
 
             result_code = process.wait()
+            lf.flush()
             duration = time.time() - start_time
-            lf.write(f"[INFO {ts()}] Exit code {result_code} after {duration:.1f}s\n")
+            lf.write(
+                f"[INFO {ts()}] Exit code {result_code} after {duration:.1f}s\n".encode("utf-8")
+            )
             status = "OK" if result_code == 0 else f"FEL ({result_code})"
             log_info(
                 f"Klar [{step_name}]: {status} ({duration:.1f}s) - logg: {step_log}"
@@ -474,33 +647,64 @@ def run_script(
 
 
 def summarize_failure(
-    step_name: str, exit_code: Any, log_path: Path, tail_lines: List[str]
+    step_name: str, exit_code: Any, log_path: Path, tail_lines: "collections.deque[str]"
 ):
     """Skriv tydlig felöversikt för ett steg."""
     log_error(f"Steg {step_name} misslyckades (exit {exit_code})")
     if tail_lines:
         log_error("Sista rader från loggen:")
-        for line in tail_lines[-8:]:
+        for line in list(tail_lines)[-8:]:
             log_error(f"  {line}")
     log_error(f"Se loggfil: {log_path}")
 
 
 def get_latest_date_dir(base_dir: Path) -> Optional[Path]:
     """Hitta senaste datummapp (YYYYMMDD) i en given basmapp."""
-    if not base_dir.exists():
+    # En scandir-passage; YYYYMMDD sorterar lexikografiskt så max räcker
+    best: Optional[str] = None
+    try:
+        with os.scandir(base_dir) as it:
+            for entry in it:
+                name = entry.name
+                if len(name) == 8 and name.isdigit() and entry.is_dir():
+                    if best is None or name > best:
+                        best = name
+    except (FileNotFoundError, NotADirectoryError):
         return None
 
-    date_dirs = []
-    for item in base_dir.iterdir():
-        if item.is_dir() and re.fullmatch(r"\d{8}", item.name):
-            date_dirs.append(item)
+    return base_dir / best if best else None
+
+
+def _find_latest_kungorelser_json(info_server_dir: Path) -> Optional[Path]:
+    """
+    Hitta senaste info_server/<YYYYMMDD>/kungorelser_<YYYYMMDD>.json.
 
-    if not date_dirs:
+    Filnamnen bär datumet, så det räcker att gå igenom datummapparna i
+    fallande namnordning i stället för att glob:a och stat:a hela trädet.
+    """
+    try:
+        with os.scandir(info_server_dir) as it:
+            date_names = sorted(
+                (
+                    entry.name
+                    for entry in it
+                    if len(entry.name) == 8
+                    and entry.name.isdigit()
+                    and entry.is_dir()
+                ),
+                reverse=True,
+            )
+    except (FileNotFoundError, NotADirectoryError):
         return None
 
-    # Sortera och returnera senaste
-    date_dirs.sort(key=lambda x: x.name)
-    return date_dirs[-1]
+    for name in date_names:
+        candidate = info_server_dir / name / f"kungorelser_{name}.json"
+        try:
+            if candidate.stat().st_size > 0:
+                return candidate
+        except OSError:
+            continue
+    return None
 
 
 def get_target_date_dir(base_dir: Path) -> Optional[Path]:
@@ -509,17 +713,18 @@ def get_target_date_dir(base_dir: Path) -> Optional[Path]:
 
     Returns: Path till datummappen eller None om ingen finns.
     """
-    if not base_dir.exists():
-        return None
-
     target_date = os.environ.get("TARGET_DATE", "")
-    target_path = base_dir / target_date if target_date else None
-
-    if target_path and target_path.exists():
-        log_info(f"[TARGET_DATE] Använder {target_path.name} i {base_dir.name}/")
-        return target_path
+    if target_date:
+        # EAFP: ett stat-anrop; saknad basmapp ger också FileNotFoundError
+        target_path = base_dir / target_date
+        try:
+            os.stat(target_path)
+            log_info(f"[TARGET_DATE] Använder {target_path.name} i {base_dir.name}/")
+            return target_path
+        except (FileNotFoundError, NotADirectoryError):
+            pass
 
-    # Fallback till senaste
+    # Fallback till senaste (hanterar själv saknad basmapp)
     latest = get_latest_date_dir(base_dir)
     if latest:
         if target_date:
@@ -533,31 +738,70 @@ def get_target_date_dir(base_dir: Path) -> Optional[Path]:
     return None
 
 
+# Datummapp per (basmapp, TARGET_DATE) för main(); töms när ALLA.py kan ha skapat nya
+_TARGET_DATE_DIR_CACHE: Dict[Tuple[Path, str], Optional[Path]] = {}
+
+
+def get_target_date_dir_cached(base_dir: Path) -> Optional[Path]:
+    """Som get_target_date_dir, men listar basmappen högst en gång per körning."""
+    cache_key = (base_dir, os.environ.get("TARGET_DATE", ""))
+    if cache_key in _TARGET_DATE_DIR_CACHE:
+        return _TARGET_DATE_DIR_CACHE[cache_key]
+    found = get_target_date_dir(base_dir)
+    _TARGET_DATE_DIR_CACHE[cache_key] = found
+    return found
+
+
+# Statusfilsplatser per datum (ren path-konstruktion, inga stat-anrop)
+_STATUS_PATHS_CACHE: Dict[str, Tuple[Path, Path]] = {}
+
+
+def _status_candidates(date_str: str) -> Tuple[Path, Path]:
+    """Returnera (info_server, djupanalys)-sökvägar till statusfilen för ett datum."""
+    paths = _STATUS_PATHS_CACHE.get(date_str)
+    if paths is None:
+        paths = (
+            POIT_DIR / "info_server" / date_str / "pipeline_status.json",
+            SEGMENT_DIR / "djupanalys" / date_str / "pipeline_status.json",
+        )
+        _STATUS_PATHS_CACHE[date_str] = paths
+    return paths
+
+
 def get_status_paths(date_str: str, ensure_parent: bool = False) -> List[Path]:
     """Returnera möjliga platser för pipeline-statusfilen."""
-    paths = []
-    info_dir = POIT_DIR / "info_server" / date_str
-    djup_dir = SEGMENT_DIR / "djupanalys" / date_str
-
-    for base in [info_dir, djup_dir]:
-        if ensure_parent:
-            base.mkdir(parents=True, exist_ok=True)
-        if base.exists():
-            paths.append(base / "pipeline_status.json")
-    return paths
+    candidates = _status_candidates(date_str)
+    if ensure_parent:
+        # mkdir(exist_ok=True) ersätter separat exists()-koll
+        for path in candidates:
+            path.parent.mkdir(parents=True, exist_ok=True)
+        return list(candidates)
+    return [path for path in candidates if path.parent.exists()]
+
+
+# Bumpas när formatet på pipeline_status.json ändras; äldre filer utan nyckel är v1
+PIPELINE_STATUS_SCHEMA_VERSION = 1
 
 
 def load_pipeline_status(date_str: str) -> Dict[str, Any]:
     """Läs statusfil om den finns, annars default."""
-    for path in get_status_paths(date_str):
-        if path.exists():
-            try:
-                with path.open("r", encoding="utf-8") as f:
-                    status = json.load(f)
-                    if isinstance(status, dict):
-                        return status
-            except Exception as e:
-                log_warn(f"Kunde inte läsa statusfil {path}: {e}")
+    for path in _status_candidates(date_str):
+        try:
+            # Bytes direkt till parsern - ingen separat UTF-8-avkodning till str
+            status = _json_loads(path.read_bytes())
+            if isinstance(status, dict):
+                version = status.get("schema_version", 1)
+                if version != PIPELINE_STATUS_SCHEMA_VERSION:
+                    log_warn(
+                        f"Ignorerar statusfil {path} med schema_version {version} "
+                        f"(förväntade {PIPELINE_STATUS_SCHEMA_VERSION})"
+                    )
+                    continue
+                return status
+        except FileNotFoundError:
+            continue
+        except Exception as e:
+            log_warn(f"Kunde inte läsa statusfil {path}: {e}")
     return {"date": date_str, "completed_steps": []}
 
 
@@ -565,13 +809,20 @@ def save_pipeline_status(date_str: str, status: Dict[str, Any]):
     """Spara statusfil till alla relevanta platser."""
     status = dict(status) if status else {}
     status.setdefault("date", date_str)
+    status["schema_version"] = PIPELINE_STATUS_SCHEMA_VERSION
     status["updated_at"] = datetime.now().isoformat()
+    # Serialisera direkt till bytes (orjson om tillgängligt) - ingen mellanliggande str
+    if orjson is not None:
+        data = orjson.dumps(status, option=orjson.OPT_INDENT_2)
+    else:
+        data = json.dumps(status, ensure_ascii=False, indent=2).encode("utf-8")
 
     for path in get_status_paths(date_str, ensure_parent=True):
         try:
-            path.write_text(
-                json.dumps(status, ensure_ascii=False, indent=2), encoding="utf-8"
-            )
+            # Atomiskt: en krasch mitt i skrivningen lämnar föregående checkpoint intakt
+            tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
             log_info(f"Status sparad: {path}")
         except Exception as e:
             log_warn(f"Kunde inte skriva status till {path}: {e}")
@@ -582,15 +833,19 @@ def is_step_done(status: Dict[str, Any], step_key: str) -> bool:
     return isinstance(completed, list) and step_key in completed
 
 
-def mark_step_done(date_str: str, status: Dict[str, Any], step_key: str):
-    """Markera ett steg som klart och spara status."""
+def mark_step_done(date_str: str, status: Dict[str, Any], *step_keys: str):
+    """Markera ett eller flera steg som klara och spara status (en skrivning, bara vid ändring)."""
     if "completed_steps" not in status or not isinstance(
         status["completed_steps"], list
     ):
         status["completed_steps"] = []
-    if step_key not in status["completed_steps"]:
-        status["completed_steps"].append(step_key)
-    save_pipeline_status(date_str, status)
+    changed = False
+    for step_key in step_keys:
+        if step_key not in status["completed_steps"]:
+            status["completed_steps"].append(step_key)
+            changed = True
+    if changed:
+        save_pipeline_status(date_str, status)
 
 
 def mark_failed_step(date_str: str, status: Dict[str, Any], step_key: str, detail: str):
@@ -646,40 +901,66 @@ def copy_final_data_to_ready(date_str: Optional[str] = None) -> bool:
 
     copied_count = 0
 
+    # Klassificera innehållet i en enda scandir-passage
+    db_files: List[Path] = []
+    xlsx_files: List[Path] = []
+    k_dirs: List[Path] = []
+    with os.scandir(date_dir) as it:
+        for entry in it:
+            name = entry.name
+            if entry.is_file():
+                if name.startswith("companies_") and name.endswith(".db"):
+                    db_files.append(Path(entry.path))
+                elif name.startswith("kungorelser_") and name.endswith(".xlsx"):
+                    xlsx_files.append(Path(entry.path))
+            elif entry.is_dir() and name.startswith("K") and "-" in name:
+                k_dirs.append(Path(entry.path))
+
     # Kopiera databases
-    db_files = list(date_dir.glob("companies_*.db"))
     for db_file in db_files:
         target = target_db_dir / db_file.name
-        shutil.copy2(db_file, target)
+        shutil.copyfile(db_file, target)
         log_info(f"  Kopierade DB: {db_file.name}")
         copied_count += 1
 
     # Kopiera Excel-filer
-    xlsx_files = list(date_dir.glob("kungorelser_*.xlsx"))
     for xlsx_file in xlsx_files:
         target = target_excel_dir / xlsx_file.name
-        shutil.copy2(xlsx_file, target)
+        shutil.copyfile(xlsx_file, target)
         log_info(f"  Kopierade Excel: {xlsx_file.name}")
         copied_count += 1
 
     # Kopiera summaries (K-mappar)
-    k_dirs = [
-        d
-        for d in date_dir.iterdir()
-        if d.is_dir() and d.name.startswith("K") and "-" in d.name
-    ]
-    for k_dir in k_dirs:
+    def _copy_summary(k_dir: Path) -> str:
         target = target_summaries_dir / k_dir.name
         if target.exists():
             shutil.rmtree(target)
-        shutil.copytree(k_dir, target)
-        log_info(f"  Kopierade summary: {k_dir.name}")
-        copied_count += 1
+        shutil.copytree(k_dir, target, copy_function=shutil.copyfile)
+        return k_dir.name
+
+    # I/O-bundet - kopiera mapparna parallellt
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        futures = [pool.submit(_copy_summary, k_dir) for k_dir in k_dirs]
+        for future in as_completed(futures):
+            log_info(f"  Kopierade summary: {future.result()}")
+            copied_count += 1
 
     log_info(f"Kopiering klar: {copied_count} objekt kopierade till {target_date_dir}")
     return True
 
 
+def _add_to_sys_path(path: Path):
+    """Lägg till en mapp först i sys.path om den inte redan finns där."""
+    entry = str(path)
+    if entry not in sys.path:
+        sys.path.insert(0, entry)
+
+
+# Lata, cachade importer av hjälpskript (importeras en gång per process)
+_run_audit_to_folder = None
+_dropbox_helpers = None
+
+
 async def run_company_evaluation(date_folder: Path) -> Tuple[int, int]:
     """
     Kör evaluation för alla företag i en datum-mapp.
@@ -689,7 +970,7 @@ async def run_company_evaluation(date_folder: Path) -> Tuple[int, int]:
     """
     try:
         # Importera funktioner från evaluate_companies.py
-        sys.path.insert(0, str(SAJT_DIR))
+        _add_to_sys_path(SAJT_DIR)
         from evaluate_companies import evaluate_companies_in_folder  # type: ignore
 
         api_key = os.getenv("OPENAI_API_KEY")
@@ -715,12 +996,18 @@ async def run_company_evaluation(date_folder: Path) -> Tuple[int, int]:
         return 0, 0
     except Exception as e:
         log_error(f"Fel vid evaluation: {e}")
-        import traceback
-
-        traceback.print_exc()
+        log_error(traceback.format_exc().rstrip())
         return 0, 0
 
 
+def _load_company_name(company_folder: Path) -> str:
+    """Läs company_name från company_data.json, fallback till mappnamnet."""
+    data = _read_json_file(company_folder / "company_data.json")
+    if isinstance(data, dict):
+        return data.get("company_name", company_folder.name)
+    return company_folder.name
+
+
 async def generate_sites_for_worthy_companies(
     date_folder: Path, percentage: float = 0.25
 ) -> Tuple[int, int]:
@@ -736,10 +1023,10 @@ async def generate_sites_for_worthy_companies(
     """
     try:
         # Importera funktioner
-        sys.path.insert(0, str(SAJT_DIR / "all_the_scripts"))
+        _add_to_sys_path(SAJT_DIR / "all_the_scripts")
         from batch_generate import generate_site_for_company  # type: ignore
 
-        sys.path.insert(0, str(SAJT_DIR))
+        _add_to_sys_path(SAJT_DIR)
         from evaluate_companies import (  # type: ignore
             find_company_folders,
             load_evaluation_from_folder,
@@ -769,43 +1056,45 @@ async def generate_sites_for_worthy_companies(
             f"Genererar hemsidor för {len(selected_companies)} av {len(worthy_companies)} värda företag ({percentage * 100:.0f}%)"
         )
 
-        generated_count = 0
-        for idx, company_folder in enumerate(selected_companies, 1):
-            company_name = company_folder.name
-            try:
-                company_data_file = company_folder / "company_data.json"
-                if company_data_file.exists():
-                    data = json.loads(company_data_file.read_text(encoding="utf-8"))
-                    company_name = data.get("company_name", company_folder.name)
-            except (OSError, json.JSONDecodeError, KeyError):
-                pass
+        # Läs alla företagsnamn i en tråd så event-loopen inte blockeras per fil
+        name_map = await asyncio.to_thread(
+            lambda: {f: _load_company_name(f) for f in selected_companies}
+        )
 
-            log_info(
-                f"  [{idx}/{len(selected_companies)}] Genererar hemsida för: {company_name}..."
-            )
+        # Genereringen är I/O-bunden (v0/OpenAI) - kör upp till 3 parallellt
+        total = len(selected_companies)
+        semaphore = asyncio.Semaphore(3)
 
-            try:
-                result = await generate_site_for_company(
-                    company_folder.name,
-                    date_folder,
-                    v0_api_key=None,
-                    openai_key=None,
-                    use_openai_enhancement=True,
-                    use_images=True,
-                    fetch_actual_costs=True,
+        async def _generate_one(idx: int, company_folder: Path) -> bool:
+            async with semaphore:
+                log_info(
+                    f"  [{idx}/{total}] Genererar hemsida för: {name_map[company_folder]}..."
                 )
+                try:
+                    result = await generate_site_for_company(
+                        company_folder.name,
+                        date_folder,
+                        v0_api_key=None,
+                        openai_key=None,
+                        use_openai_enhancement=True,
+                        use_images=True,
+                        fetch_actual_costs=True,
+                    )
+                    preview_url = result.get("preview_url", "N/A")
+                except Exception as e:
+                    log_error(f"    ❌ Fel vid generering ({company_folder.name}): {e}")
+                    return False
 
-                preview_url = result.get("preview_url", "N/A")
-                log_info(f"    ✅ Klart! Preview URL: {preview_url}")
-                generated_count += 1
-
-                # Liten paus mellan genereringar
-                if idx < len(selected_companies):
-                    await asyncio.sleep(2)
+                log_info(f"    ✅ Klart ({company_folder.name})! Preview URL: {preview_url}")
+                return True
 
-            except Exception as e:
-                log_error(f"    ❌ Fel vid generering: {e}")
-                continue
+        results = await asyncio.gather(
+            *(
+                _generate_one(idx, company_folder)
+                for idx, company_folder in enumerate(selected_companies, 1)
+            )
+        )
+        generated_count = sum(1 for ok in results if ok)
 
         log_info(f"Site generation klar: {generated_count} hemsidor genererade")
         return len(worthy_companies), generated_count
@@ -815,18 +1104,22 @@ async def generate_sites_for_worthy_companies(
         return 0, 0
     except Exception as e:
         log_error(f"Fel vid site generation: {e}")
-        import traceback
-
-        traceback.print_exc()
+        log_error(traceback.format_exc().rstrip())
         return 0, 0
 
 
+# Parsad sajt-config, nyckel (path, mtime_ns, size) -> config-dict
+_SAJT_CONFIG_CACHE: Dict[Tuple[str, int, int], Dict[str, Any]] = {}
+
+
 def load_sajt_config() -> Dict[str, Any]:
     """
     Läs audit/site-config från 3_sajt/config_ny.txt.
+
+    Resultatet cachas per (path, mtime, size) så filen parsas bara om när den ändrats.
     
     Returns:
-        Dict med config-värden
+        Dict med config-värden (kopia, får muteras av anroparen)
     """
     config = {
         "audit_enabled": False,
@@ -839,9 +1132,16 @@ def load_sajt_config() -> Dict[str, Any]:
     }
     
     config_path = SAJT_DIR / "config_ny.txt"
-    if not config_path.exists():
+    try:
+        st = config_path.stat()
+    except FileNotFoundError:
         log_warn(f"Config-fil saknas: {config_path}")
         return config
+
+    cache_key = (str(config_path), st.st_mtime_ns, st.st_size)
+    cached = _SAJT_CONFIG_CACHE.get(cache_key)
+    if cached is not None:
+        return cached.copy()
     
     try:
         for line in config_path.read_text(encoding="utf-8").splitlines():
@@ -870,8 +1170,11 @@ def load_sajt_config() -> Dict[str, Any]:
                     config["site_max_antal"] = int(value)
     except Exception as e:
         log_warn(f"Kunde inte läsa sajt-config: {e}")
-    
-    return config
+        return config
+
+    _SAJT_CONFIG_CACHE.clear()
+    _SAJT_CONFIG_CACHE[cache_key] = config
+    return config.copy()
 
 
 def load_audit_config() -> dict:
@@ -885,6 +1188,48 @@ def load_audit_config() -> dict:
     }
 
 
+def _read_audit_candidate(company_dir: Path) -> Tuple[set, Optional[Any]]:
+    """Lista företagsmappen en gång och läs company_data.json om den finns."""
+    names = _dir_entry_names(company_dir)
+    if "company_data.json" not in names:
+        return names, None
+    return names, _read_json_file(company_dir / "company_data.json")
+
+
+def _qualify_for_audit(
+    company_dir: Path, names: set, data: Optional[Any], threshold: float
+) -> Optional[Dict[str, Any]]:
+    """Returnera audit-kandidat om företaget har verifierad domän över threshold, annars None."""
+    if not isinstance(data, dict):
+        return None
+
+    # Kontrollera domän
+    domain_info = data.get("domain", {})
+    domain_url = domain_info.get("guess", "")
+    confidence = domain_info.get("confidence", 0)
+    status = domain_info.get("status", "unknown")
+
+    # Kräv domän med tillräcklig confidence
+    if not domain_url:
+        return None
+    # Acceptera verified, ai_verified, eller match status
+    if status not in ("verified", "ai_verified", "match"):
+        return None
+    if confidence < threshold:
+        return None
+
+    # Skippa om audit redan finns (från samma scandir, ingen extra stat)
+    if "audit_report.json" in names:
+        return None
+
+    return {
+        "dir": company_dir,
+        "domain": domain_url,
+        "confidence": confidence,
+        "company_name": data.get("company_name", company_dir.name),
+    }
+
+
 async def run_audits_for_qualified_companies(date_folder: Path) -> tuple[int, int]:
     """
     Kör audits för företag med verifierad domän och tillräcklig confidence.
@@ -898,6 +1243,7 @@ async def run_audits_for_qualified_companies(date_folder: Path) -> tuple[int, in
     Returns:
         (qualified_count, audited_count) - Antal kvalificerade och antal auditade
     """
+    global _run_audit_to_folder
     audit_config = load_audit_config()
     
     if not audit_config["audit_enabled"]:
@@ -911,50 +1257,35 @@ async def run_audits_for_qualified_companies(date_folder: Path) -> tuple[int, in
     
     try:
         # Importera audit-funktion (dynamisk import från 3_sajt/all_the_scripts)
-        sys.path.insert(0, str(SAJT_DIR / "all_the_scripts"))
-        from standalone_audit import run_audit_to_folder  # type: ignore[import-not-found]
+        if _run_audit_to_folder is None:
+            _add_to_sys_path(SAJT_DIR / "all_the_scripts")
+            from standalone_audit import run_audit_to_folder  # type: ignore[import-not-found]
+
+            _run_audit_to_folder = run_audit_to_folder
         
         # Hitta alla K-mappar
         company_dirs = [d for d in date_folder.iterdir() if d.is_dir() and d.name.startswith("K")]
         
-        qualified_companies = []
-        
-        for company_dir in company_dirs:
-            # Läs company_data.json
-            company_data_file = company_dir / "company_data.json"
-            if not company_data_file.exists():
-                continue
-            
-            try:
-                data = json.loads(company_data_file.read_text(encoding="utf-8"))
-            except (json.JSONDecodeError, OSError):
-                continue
-            
-            # Kontrollera domän
-            domain_info = data.get("domain", {})
-            domain_url = domain_info.get("guess", "")
-            confidence = domain_info.get("confidence", 0)
-            status = domain_info.get("status", "unknown")
-            
-            # Kräv domän med tillräcklig confidence
-            if not domain_url:
-                continue
-            # Acceptera verified, ai_verified, eller match status
-            if status not in ("verified", "ai_verified", "match"):
-                continue
-            if confidence < threshold:
-                continue
-            
-            # Skippa om audit redan finns
-            if (company_dir / "audit_report.json").exists():
-                continue
-            
-            qualified_companies.append({
-                "dir": company_dir,
-                "domain": domain_url,
-                "confidence": confidence,
-                "company_name": data.get("company_name", company_dir.name),
-            })
+        # Läs company_data.json parallellt i batchar (i en tråd utanför event-loopen)
+        # och sluta så fort max_antal kvalificerade hittats - resten parsas aldrig
+        def _scan() -> Tuple[List[Dict[str, Any]], bool]:
+            found: List[Dict[str, Any]] = []
+            batch_size = _COMPANY_IO_WORKERS
+            with ThreadPoolExecutor(max_workers=_COMPANY_IO_WORKERS) as pool:
+                for start in range(0, len(company_dirs), batch_size):
+                    batch = company_dirs[start : start + batch_size]
+                    for company_dir, (names, data) in zip(
+                        batch, pool.map(_read_audit_candidate, batch)
+                    ):
+                        company = _qualify_for_audit(company_dir, names, data, threshold)
+                        if company is None:
+                            continue
+                        found.append(company)
+                        if 0 < max_antal <= len(found):
+                            return found, True
+            return found, False
+
+        qualified_companies, stopped_early = await asyncio.to_thread(_scan)
         
         if not qualified_companies:
             log_info("Inga företag kvalificerade för audit")
@@ -963,7 +1294,12 @@ async def run_audits_for_qualified_companies(date_folder: Path) -> tuple[int, in
         # Begränsa till max_antal
         to_audit = qualified_companies[:max_antal]
         
-        log_info(f"Kör audits för {len(to_audit)} av {len(qualified_companies)} kvalificerade företag")
+        if stopped_early:
+            log_info(
+                f"Kör audits för {len(to_audit)} kvalificerade företag (max {max_antal} nått - övriga mappar genomsöktes inte)"
+            )
+        else:
+            log_info(f"Kör audits för {len(to_audit)} av {len(qualified_companies)} kvalificerade företag")
         
         audited_count = 0
         for idx, company in enumerate(to_audit, 1):
@@ -979,7 +1315,7 @@ async def run_audits_for_qualified_companies(date_folder: Path) -> tuple[int, in
             log_info(f"  [{idx}/{len(to_audit)}] Audit: {company_name} ({domain_url}, {confidence:.0%})")
             
             try:
-                result = run_audit_to_folder(domain_url, company_dir)
+                result = _run_audit_to_folder(domain_url, company_dir)
                 
                 if result.get("audit_pdf"):
                     log_info(f"    ✅ PDF skapad: audit_report.pdf")
@@ -1004,30 +1340,70 @@ async def run_audits_for_qualified_companies(date_folder: Path) -> tuple[int, in
         return 0, 0
     except Exception as e:
         log_error(f"Fel vid audits: {e}")
-        import traceback
-        traceback.print_exc()
+        log_error(traceback.format_exc().rstrip())
         return 0, 0
 
 
 MAIL_GREETING_KEYWORDS = ("hej", "hejsan", "tjena", "tjabba", "hallå", "god ")
+# Alla hälsningsfraser i ett förkompilerat mönster (ett match-anrop per rad)
+_GREETING_RE = re.compile(
+    "|".join(re.escape(greet) for greet in MAIL_GREETING_KEYWORDS), re.IGNORECASE
+)
+
+
+# Trådar för parallell läsning av små JSON-filer i företagsmappar
+_COMPANY_IO_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+
+def _read_json_file(path: Path) -> Optional[Any]:
+    """Läs och parsa en JSON-fil (bytes direkt), None om den saknas eller är trasig."""
+    try:
+        return _json_loads(path.read_bytes())
+    except (OSError, ValueError):
+        return None
+
+
+def _iter_company_dirs(date_folder: Path) -> List[os.DirEntry]:
+    """Lista K-mappar (företagsmappar) i en datum-mapp med en scandir-passage."""
+    try:
+        with os.scandir(date_folder) as it:
+            return [
+                entry
+                for entry in it
+                if entry.name.startswith("K")
+                and "-" in entry.name
+                and entry.is_dir(follow_symlinks=False)
+            ]
+    except (FileNotFoundError, NotADirectoryError):
+        return []
+
+
+def _dir_entry_names(folder: Path) -> set:
+    """Namn på allt innehåll i en mapp (ett scandir-anrop i stället för en exists() per fil)."""
+    try:
+        with os.scandir(folder) as it:
+            return {entry.name for entry in it}
+    except OSError:
+        return set()
 
 
 def _collect_preview_audit_entries(date_folder: Path) -> List[Dict[str, Any]]:
     entries: List[Dict[str, Any]] = []
-    if not date_folder.exists():
-        return entries
-
-    for folder in date_folder.iterdir():
-        if (
-            not folder.is_dir()
-            or not folder.name.startswith("K")
-            or "-" not in folder.name
-        ):
-            continue
+
+    # Lös upp datum-mappen en gång; länkarna byggs sedan med strängar i stället
+    # för ett resolve() (realpath) per fil
+    try:
+        base_uri: Optional[str] = date_folder.resolve().as_uri()
+    except (OSError, ValueError):
+        base_uri = None
+
+    for dir_entry in _iter_company_dirs(date_folder):
+        folder = Path(dir_entry.path)
+        names = _dir_entry_names(folder)
 
         preview_url = None
         preview_file = folder / "preview_url.txt"
-        if preview_file.exists():
+        if "preview_url.txt" in names:
             try:
                 preview_text = preview_file.read_text(encoding="utf-8").strip()
                 if preview_text:
@@ -1041,18 +1417,21 @@ def _collect_preview_audit_entries(date_folder: Path) -> List[Dict[str, Any]]:
         audit_json = folder / "audit_report.json"
         profile_file = folder / "company_profile.txt"
         link_source = None
-        if audit_pdf.exists():
+        if "audit_report.pdf" in names:
             link_source = audit_pdf
-        elif audit_json.exists():
+        elif "audit_report.json" in names:
             link_source = audit_json
-        elif profile_file.exists():
+        elif "company_profile.txt" in names:
             link_source = profile_file
 
         if link_source:
-            try:
-                audit_link = link_source.resolve().as_uri()
-            except OSError:
-                audit_link = str(link_source.resolve())
+            if base_uri is not None:
+                audit_link = f"{base_uri}/{quote(folder.name)}/{quote(link_source.name)}"
+            else:
+                try:
+                    audit_link = link_source.resolve().as_uri()
+                except OSError:
+                    audit_link = str(link_source.resolve())
 
         if preview_url or audit_link:
             entries.append(
@@ -1061,121 +1440,150 @@ def _collect_preview_audit_entries(date_folder: Path) -> List[Dict[str, Any]]:
                     "folder_path": folder,
                     "preview_url": preview_url,
                     "audit_link": audit_link,
+                    # Från samma scandir - slipper exists() på mail.txt senare
+                    "has_mail_txt": "mail.txt" in names,
                 }
             )
 
     return entries
 
 
-def _update_mail_ready_with_links(
-    date_folder: Path, entries: List[Dict[str, Any]]
-) -> int:
-    xlsx = date_folder / "mail_ready.xlsx"
-    if not xlsx.exists():
-        return 0
+def _find_kungorelser_xlsx(date_folder: Path) -> Optional[Path]:
+    """Hitta kungorelser_<datum>.xlsx, fallback till första matchande fil."""
+    xlsx = date_folder / f"kungorelser_{date_folder.name}.xlsx"
+    if xlsx.exists():
+        return xlsx
+    return next(date_folder.glob("kungorelser_*.xlsx"), None)
+
+
+def _sheet_columns(ws) -> Dict[str, int]:
+    """Mappa rubrik -> kolumnnummer (1-baserat) från bladets första rad."""
+    return {str(cell.value).strip(): cell.column for cell in ws[1] if cell.value is not None}
+
+
+def _ensure_sheet_column(ws, columns: Dict[str, int], name: str) -> int:
+    """Returnera kolumnnummer för en rubrik, lägg till kolumnen sist om den saknas."""
+    col = columns.get(name)
+    if col is None:
+        col = max(columns.values(), default=0) + 1
+        ws.cell(row=1, column=col, value=name)
+        columns[name] = col
+    return col
+
+
+def _update_workbook(xlsx: Path, updaters: List[Callable[[Any], int]]) -> Optional[List[int]]:
+    """
+    Ladda en arbetsbok en gång, kör alla updaters på den och spara en gång.
+
+    Bladen muteras på plats med openpyxl, så övriga blad och formatering lämnas orörda.
+
+    Returns:
+        Resultat från varje updater, eller None om filen inte kunde läsas/sparas
+    """
+    from openpyxl import load_workbook
+
     try:
-        df = pd.read_excel(xlsx, sheet_name="Mails")
+        wb = load_workbook(xlsx)
     except Exception as exc:
-        log_warn(f"Misslyckades med att läsa mail_ready.xlsx: {exc}")
-        return 0
+        log_warn(f"Misslyckades med att läsa {xlsx.name}: {exc}")
+        return None
+    try:
+        results = [update(wb) for update in updaters]
+        if any(results):
+            wb.save(xlsx)
+        return results
+    except Exception as exc:
+        log_warn(f"Misslyckades med att uppdatera {xlsx.name}: {exc}")
+        return None
+    finally:
+        wb.close()
+
 
-    if "folder" not in df.columns:
+def _apply_mail_ready_links(wb, entries: List[Dict[str, Any]]) -> int:
+    """Skriv preview-/audit-länkar (och mail_content) till bladet 'Mails'."""
+    if "Mails" not in wb.sheetnames:
+        log_warn("mail_ready.xlsx saknar bladet 'Mails' – kan inte uppdatera länkar")
+        return 0
+    ws = wb["Mails"]
+    columns = _sheet_columns(ws)
+    folder_col = columns.get("folder")
+    if folder_col is None:
         log_warn("mail_ready.xlsx saknar kolumnen 'folder' – kan inte uppdatera länkar")
         return 0
 
-    if "site_preview_url" not in df.columns:
-        df["site_preview_url"] = ""
-    if "audit_note" not in df.columns:
-        df["audit_note"] = ""
+    preview_col = _ensure_sheet_column(ws, columns, "site_preview_url")
+    audit_col = _ensure_sheet_column(ws, columns, "audit_note")
+    mail_col = columns.get("mail_content")
 
-    folder_series = df["folder"].astype(str).str.strip()
+    by_folder = {entry["folder_name"]: entry for entry in entries}
+    mail_contents: Dict[str, Optional[str]] = {}
     updated_rows = 0
-    mail_col = "mail_content" if "mail_content" in df.columns else None
 
-    for entry in entries:
-        folder = entry["folder_name"]
-        mask = folder_series == folder
-        if not mask.any():
+    for row in ws.iter_rows(min_row=2):
+        entry = by_folder.get(str(row[folder_col - 1].value).strip())
+        if entry is None:
             continue
         row_updated = False
         if entry["preview_url"]:
-            df.loc[mask, "site_preview_url"] = entry["preview_url"]
+            row[preview_col - 1].value = entry["preview_url"]
             row_updated = True
         if entry["audit_link"]:
-            df.loc[mask, "audit_note"] = entry["audit_link"]
+            row[audit_col - 1].value = entry["audit_link"]
             row_updated = True
 
         # Uppdatera mail_content så den matchar mail.txt med länkar
         if mail_col and row_updated:
-            mail_file = entry["folder_path"] / "mail.txt"
-            if mail_file.exists():
+            folder = entry["folder_name"]
+            if folder not in mail_contents and not entry.get("has_mail_txt", True):
+                mail_contents[folder] = None
+            if folder not in mail_contents:
                 try:
-                    new_content = mail_file.read_text(encoding="utf-8")
-                    df.loc[mask, mail_col] = new_content
+                    mail_contents[folder] = (entry["folder_path"] / "mail.txt").read_text(
+                        encoding="utf-8"
+                    )
                 except OSError:
-                    pass
+                    mail_contents[folder] = None
+            if mail_contents[folder] is not None:
+                row[mail_col - 1].value = mail_contents[folder]
 
         if row_updated:
-            updated_rows += int(mask.sum())
-
-    if updated_rows:
-        with pd.ExcelWriter(xlsx, engine="openpyxl") as writer:
-            df.to_excel(writer, sheet_name="Mails", index=False)
+            updated_rows += 1
 
     return updated_rows
 
 
-def _update_kungorelser_excel(date_folder: Path, entries: List[Dict[str, Any]]) -> int:
-    date_str = date_folder.name
-    xlsx = date_folder / f"kungorelser_{date_str}.xlsx"
-    if not xlsx.exists():
-        # Fallback till första matchande fil
-        matches = list(date_folder.glob("kungorelser_*.xlsx"))
-        if not matches:
-            return 0
-        xlsx = matches[0]
-
-    try:
-        sheets = pd.read_excel(xlsx, sheet_name=None)
-    except Exception as exc:
-        log_warn(f"Misslyckades med att läsa {xlsx.name}: {exc}")
+def _apply_kungorelser_links(wb, xlsx_name: str, entries: List[Dict[str, Any]]) -> int:
+    """Skriv preview-/audit-länkar till bladet 'Data' i kungorelser_*.xlsx."""
+    if "Data" not in wb.sheetnames:
+        log_warn(f"{xlsx_name} saknar bladet 'Data' eller kolumnen 'Mapp'")
         return 0
-
-    df = sheets.get("Data")
-    if df is None or "Mapp" not in df.columns:
-        log_warn(f"{xlsx.name} saknar bladet 'Data' eller kolumnen 'Mapp'")
+    ws = wb["Data"]
+    columns = _sheet_columns(ws)
+    folder_col = columns.get("Mapp")
+    if folder_col is None:
+        log_warn(f"{xlsx_name} saknar bladet 'Data' eller kolumnen 'Mapp'")
         return 0
 
-    if "Preview URL" not in df.columns:
-        df["Preview URL"] = ""
-    if "Audit Link" not in df.columns:
-        df["Audit Link"] = ""
-
-    folder_series = (
-        df["Mapp"].astype(str).str.strip().str.replace("/", "-", regex=False)
-    )
+    preview_col = _ensure_sheet_column(ws, columns, "Preview URL")
+    audit_col = _ensure_sheet_column(ws, columns, "Audit Link")
 
+    by_folder = {entry["folder_name"]: entry for entry in entries}
     updated_rows = 0
-    for entry in entries:
-        folder = entry["folder_name"]
-        mask = folder_series == folder
-        if not mask.any():
+
+    for row in ws.iter_rows(min_row=2):
+        folder = str(row[folder_col - 1].value).strip().replace("/", "-")
+        entry = by_folder.get(folder)
+        if entry is None:
             continue
         row_updated = False
         if entry["preview_url"]:
-            df.loc[mask, "Preview URL"] = entry["preview_url"]
+            row[preview_col - 1].value = entry["preview_url"]
             row_updated = True
         if entry["audit_link"]:
-            df.loc[mask, "Audit Link"] = entry["audit_link"]
+            row[audit_col - 1].value = entry["audit_link"]
             row_updated = True
         if row_updated:
-            updated_rows += int(mask.sum())
-
-    if updated_rows:
-        sheets["Data"] = df
-        with pd.ExcelWriter(xlsx, engine="openpyxl") as writer:
-            for name, sheet_df in sheets.items():
-                sheet_df.to_excel(writer, sheet_name=name, index=False)
+            updated_rows += 1
 
     return updated_rows
 
@@ -1186,8 +1594,7 @@ def _insert_snippet_after_greeting(content: str, snippet: str) -> Tuple[str, boo
     lines = content.splitlines()
     insert_idx = None
     for idx, line in enumerate(lines):
-        stripped = line.strip().lower()
-        if any(stripped.startswith(greet) for greet in MAIL_GREETING_KEYWORDS):
+        if _GREETING_RE.match(line.lstrip()):
             insert_idx = idx + 1
             while insert_idx < len(lines) and not lines[insert_idx].strip():
                 insert_idx += 1
@@ -1207,9 +1614,9 @@ def _update_mail_txt_with_links(entries: List[Dict[str, Any]]) -> int:
         audit_link = entry.get("audit_link")
         if not preview_url and not audit_link:
             continue
-        mail_file = entry["folder_path"] / "mail.txt"
-        if not mail_file.exists():
+        if not entry.get("has_mail_txt", True):
             continue
+        mail_file = entry["folder_path"] / "mail.txt"
         try:
             content = mail_file.read_text(encoding="utf-8")
         except OSError:
@@ -1230,7 +1637,7 @@ def _update_mail_txt_with_links(entries: List[Dict[str, Any]]) -> int:
 
         snippet = "\n".join(snippet_parts)
         new_content, changed = _insert_snippet_after_greeting(content, snippet)
-        if not changed or new_content == content:
+        if not changed:
             continue
         try:
             mail_file.write_text(new_content, encoding="utf-8")
@@ -1242,6 +1649,10 @@ def _update_mail_txt_with_links(entries: List[Dict[str, Any]]) -> int:
 
 
 def sync_preview_and_audit_links(date_folder: Path) -> None:
+    """
+    Uppdatera preview-/audit-länkar i mail_ready.xlsx, kungorelser_*.xlsx och mail.txt,
+    samt skriv 'Audits'-bladet. Varje arbetsbok laddas och sparas bara en gång.
+    """
     try:
         entries = _collect_preview_audit_entries(date_folder)
     except Exception as exc:
@@ -1252,76 +1663,146 @@ def sync_preview_and_audit_links(date_folder: Path) -> None:
         log_info("[LINK SYNC] Inga preview- eller audit-länkar att uppdatera")
         return
 
-    mail_ready_rows = _update_mail_ready_with_links(date_folder, entries)
-    kungorelser_rows = _update_kungorelser_excel(date_folder, entries)
+    try:
+        audit_entries = _collect_audit_data(date_folder)
+    except Exception as exc:
+        log_warn(f"[AUDIT EXCEL] Misslyckades att samla audit-data: {exc}")
+        audit_entries = []
+
+    mail_ready_rows = 0
+    kungorelser_rows = 0
+    audit_files = 0
+
+    mail_ready_xlsx = date_folder / "mail_ready.xlsx"
+    if mail_ready_xlsx.exists():
+        updaters = [lambda wb: _apply_mail_ready_links(wb, entries)]
+        if audit_entries:
+            updaters.append(lambda wb: _replace_audits_sheet(wb, audit_entries))
+        results = _update_workbook(mail_ready_xlsx, updaters)
+        if results:
+            mail_ready_rows = results[0]
+            if audit_entries:
+                log_info(
+                    f"[AUDIT EXCEL] Lade till 'Audits'-blad i mail_ready.xlsx ({len(audit_entries)} rader)"
+                )
+                audit_files += 1
+
+    kungorelser_xlsx = _find_kungorelser_xlsx(date_folder)
+    if kungorelser_xlsx is not None:
+        updaters = [lambda wb: _apply_kungorelser_links(wb, kungorelser_xlsx.name, entries)]
+        if audit_entries:
+            updaters.append(lambda wb: _replace_audits_sheet(wb, audit_entries))
+        results = _update_workbook(kungorelser_xlsx, updaters)
+        if results:
+            kungorelser_rows = results[0]
+            if audit_entries:
+                log_info(
+                    f"[AUDIT EXCEL] Lade till 'Audits'-blad i {kungorelser_xlsx.name} ({len(audit_entries)} rader)"
+                )
+                audit_files += 1
+
     mail_files = _update_mail_txt_with_links(entries)
 
     log_info(
         "[LINK SYNC] Uppdaterade länkar för "
         f"{len(entries)} företag (mail_ready={mail_ready_rows}, "
-        f"kungorelser={kungorelser_rows}, mail.txt={mail_files})"
+        f"kungorelser={kungorelser_rows}, mail.txt={mail_files}, audits-blad={audit_files})"
     )
 
 
+def _load_audit_entry(folder: Path) -> Optional[Dict[str, Any]]:
+    """Bygg audit-rad för en företagsmapp, None om audit_report.json saknas/är trasig."""
+    names = _dir_entry_names(folder)
+    if "audit_report.json" not in names:
+        return None
+
+    audit_data = _read_json_file(folder / "audit_report.json")
+    if not isinstance(audit_data, dict):
+        return None
+
+    # Hämta företagsnamn
+    company_name = folder.name
+    if "company_data.json" in names:
+        company_data = _read_json_file(folder / "company_data.json")
+        if isinstance(company_data, dict):
+            company_name = company_data.get("company_name", folder.name)
+
+    # Extrahera relevant data
+    company_info = audit_data.get("company", {})
+    scores = audit_data.get("scores", {})
+    meta = audit_data.get("_meta", {})
+    strengths = audit_data.get("strengths", [])
+    weaknesses = audit_data.get("weaknesses", [])
+    recommendations = audit_data.get("recommendations", [])
+
+    return {
+        "folder": folder.name,
+        "company_name": company_name,
+        "url": meta.get("url", ""),
+        "audit_date": meta.get("audit_date", "")[:10] if meta.get("audit_date") else "",
+        "industry": company_info.get("industry", ""),
+        # Poäng lämnas som tal (None = tom cell) så kolumnerna förblir numeriska i Excel
+        "design_score": scores.get("design"),
+        "content_score": scores.get("content"),
+        "usability_score": scores.get("usability"),
+        "mobile_score": scores.get("mobile"),
+        "seo_score": scores.get("seo"),
+        "overall_score": scores.get("overall"),
+        "strengths": "; ".join(strengths[:3]) if strengths else "",
+        "weaknesses": "; ".join(weaknesses[:3]) if weaknesses else "",
+        "recommendations": "; ".join(recommendations[:3]) if recommendations else "",
+    }
+
+
 def _collect_audit_data(date_folder: Path) -> List[Dict[str, Any]]:
     """
     Samla audit-data från alla företagsmappar.
+
+    Mapparna läses parallellt i en trådpool (läsningarna är små och I/O-bundna).
     
     Returns:
         Lista med audit-data för varje företag som har audit_report.json
     """
-    audit_entries = []
-    
-    for folder in date_folder.iterdir():
-        if not folder.is_dir() or not folder.name.startswith("K") or "-" not in folder.name:
-            continue
-        
-        audit_file = folder / "audit_report.json"
-        if not audit_file.exists():
-            continue
-        
-        try:
-            audit_data = json.loads(audit_file.read_text(encoding="utf-8"))
-        except (json.JSONDecodeError, OSError):
-            continue
-        
-        # Hämta företagsnamn
-        company_name = folder.name
-        company_data_file = folder / "company_data.json"
-        if company_data_file.exists():
-            try:
-                company_data = json.loads(company_data_file.read_text(encoding="utf-8"))
-                company_name = company_data.get("company_name", folder.name)
-            except (json.JSONDecodeError, OSError):
-                pass
-        
-        # Extrahera relevant data
-        company_info = audit_data.get("company", {})
-        scores = audit_data.get("scores", {})
-        meta = audit_data.get("_meta", {})
-        strengths = audit_data.get("strengths", [])
-        weaknesses = audit_data.get("weaknesses", [])
-        recommendations = audit_data.get("recommendations", [])
-        
-        entry = {
-            "folder": folder.name,
-            "company_name": company_name,
-            "url": meta.get("url", ""),
-            "audit_date": meta.get("audit_date", "")[:10] if meta.get("audit_date") else "",
-            "industry": company_info.get("industry", ""),
-            "design_score": scores.get("design", ""),
-            "content_score": scores.get("content", ""),
-            "usability_score": scores.get("usability", ""),
-            "mobile_score": scores.get("mobile", ""),
-            "seo_score": scores.get("seo", ""),
-            "overall_score": scores.get("overall", ""),
-            "strengths": "; ".join(strengths[:3]) if strengths else "",
-            "weaknesses": "; ".join(weaknesses[:3]) if weaknesses else "",
-            "recommendations": "; ".join(recommendations[:3]) if recommendations else "",
-        }
-        audit_entries.append(entry)
-    
-    return audit_entries
+    folders = [Path(entry.path) for entry in _iter_company_dirs(date_folder)]
+    if not folders:
+        return []
+
+    with ThreadPoolExecutor(max_workers=_COMPANY_IO_WORKERS) as pool:
+        return [entry for entry in pool.map(_load_audit_entry, folders) if entry]
+
+
+# Kolumner i 'Audits'-bladet: (nyckel i audit-entry, rubrik)
+_AUDIT_SHEET_COLUMNS = [
+    ("folder", "Mapp"),
+    ("company_name", "Företag"),
+    ("url", "Hemsida"),
+    ("audit_date", "Audit-datum"),
+    ("industry", "Bransch"),
+    ("overall_score", "Helhet"),
+    ("design_score", "Design"),
+    ("content_score", "Innehåll"),
+    ("usability_score", "Användbarhet"),
+    ("mobile_score", "Mobil"),
+    ("seo_score", "SEO"),
+    ("strengths", "Styrkor"),
+    ("weaknesses", "Svagheter"),
+    ("recommendations", "Rekommendationer"),
+]
+
+
+def _replace_audits_sheet(wb, audit_entries: List[Dict[str, Any]]) -> int:
+    """Skapa/ersätt bladet 'Audits' i en öppen arbetsbok. Returnerar antal rader."""
+    if "Audits" in wb.sheetnames:
+        index = wb.sheetnames.index("Audits")
+        del wb["Audits"]
+        ws = wb.create_sheet("Audits", index)
+    else:
+        ws = wb.create_sheet("Audits")
+
+    ws.append([header for _, header in _AUDIT_SHEET_COLUMNS])
+    for entry in audit_entries:
+        ws.append([entry.get(key, "") for key, _ in _AUDIT_SHEET_COLUMNS])
+    return len(audit_entries)
 
 
 def create_audits_excel_sheet(date_folder: Path) -> int:
@@ -1331,6 +1812,9 @@ def create_audits_excel_sheet(date_folder: Path) -> int:
     Lägger till bladet i:
     - mail_ready.xlsx
     - kungorelser_*.xlsx
+
+    (sync_preview_and_audit_links skriver redan bladet i samma pass som länkarna;
+    denna funktion finns för fristående körning.)
     
     Returns:
         Antal filer som uppdaterades
@@ -1341,85 +1825,13 @@ def create_audits_excel_sheet(date_folder: Path) -> int:
         log_info("[AUDIT EXCEL] Inga audit-rapporter att lägga till i Excel")
         return 0
     
-    # Skapa DataFrame
-    df_audits = pd.DataFrame(audit_entries)
-    
-    # Kolumnordning för bättre läsbarhet
-    column_order = [
-        "folder", "company_name", "url", "audit_date", "industry",
-        "overall_score", "design_score", "content_score", "usability_score",
-        "mobile_score", "seo_score", "strengths", "weaknesses", "recommendations"
-    ]
-    df_audits = df_audits[[c for c in column_order if c in df_audits.columns]]
-    
-    # Byt namn på kolumner för tydlighet
-    column_names = {
-        "folder": "Mapp",
-        "company_name": "Företag",
-        "url": "Hemsida",
-        "audit_date": "Audit-datum",
-        "industry": "Bransch",
-        "overall_score": "Helhet",
-        "design_score": "Design",
-        "content_score": "Innehåll",
-        "usability_score": "Användbarhet",
-        "mobile_score": "Mobil",
-        "seo_score": "SEO",
-        "strengths": "Styrkor",
-        "weaknesses": "Svagheter",
-        "recommendations": "Rekommendationer",
-    }
-    df_audits = df_audits.rename(columns=column_names)
-    
     updated_files = 0
-    
-    # Uppdatera mail_ready.xlsx
-    mail_ready_xlsx = date_folder / "mail_ready.xlsx"
-    if mail_ready_xlsx.exists():
-        try:
-            # Läs befintliga blad
-            with pd.ExcelFile(mail_ready_xlsx) as xls:
-                sheets = {sheet: pd.read_excel(xls, sheet_name=sheet) for sheet in xls.sheet_names}
-            
-            # Lägg till/ersätt Audits-bladet
-            sheets["Audits"] = df_audits
-            
-            # Skriv tillbaka
-            with pd.ExcelWriter(mail_ready_xlsx, engine="openpyxl") as writer:
-                for sheet_name, sheet_df in sheets.items():
-                    sheet_df.to_excel(writer, sheet_name=sheet_name, index=False)
-            
-            log_info(f"[AUDIT EXCEL] Lade till 'Audits'-blad i mail_ready.xlsx ({len(audit_entries)} rader)")
-            updated_files += 1
-        except Exception as e:
-            log_warn(f"[AUDIT EXCEL] Kunde inte uppdatera mail_ready.xlsx: {e}")
-    
-    # Uppdatera kungorelser_*.xlsx
-    date_str = date_folder.name
-    kungorelser_xlsx = date_folder / f"kungorelser_{date_str}.xlsx"
-    if not kungorelser_xlsx.exists():
-        matches = list(date_folder.glob("kungorelser_*.xlsx"))
-        if matches:
-            kungorelser_xlsx = matches[0]
-    
-    if kungorelser_xlsx.exists():
-        try:
-            # Läs befintliga blad
-            with pd.ExcelFile(kungorelser_xlsx) as xls:
-                sheets = {sheet: pd.read_excel(xls, sheet_name=sheet) for sheet in xls.sheet_names}
-            
-            # Lägg till/ersätt Audits-bladet
-            sheets["Audits"] = df_audits
-            
-            # Skriv tillbaka
-            with pd.ExcelWriter(kungorelser_xlsx, engine="openpyxl") as writer:
-                for sheet_name, sheet_df in sheets.items():
-                    sheet_df.to_excel(writer, sheet_name=sheet_name, index=False)
-            
-            log_info(f"[AUDIT EXCEL] Lade till 'Audits'-blad i {kungorelser_xlsx.name} ({len(audit_entries)} rader)")
+    for xlsx in (date_folder / "mail_ready.xlsx", _find_kungorelser_xlsx(date_folder)):
+        if xlsx is None or not xlsx.exists():
+            continue
+        if _update_workbook(xlsx, [lambda wb: _replace_audits_sheet(wb, audit_entries)]):
+            log_info(f"[AUDIT EXCEL] Lade till 'Audits'-blad i {xlsx.name} ({len(audit_entries)} rader)")
             updated_files += 1
-        except Exception as e:
-            log_warn(f"[AUDIT EXCEL] Kunde inte uppdatera {kungorelser_xlsx.name}: {e}")
     
     return updated_files
 
@@ -1434,18 +1846,25 @@ def copy_to_dropbox(date_folder: Path) -> bool:
     Returns:
         True om kopiering lyckades, False annars
     """
+    global _dropbox_helpers
     try:
         # Importera funktioner från copy_to_dropbox.py om den finns
         dropbox_script = DROPBOX_DIR / "copy_to_dropbox.py"
 
         if dropbox_script.exists() and dropbox_script.stat().st_size > 0:
-            # Importera funktionerna direkt istället för att köra som subprocess
-            sys.path.insert(0, str(DROPBOX_DIR))
+            # Importera funktionerna direkt istället för att köra som subprocess.
+            # DROPBOX_DIR ligger kvar i sys.path: copy_to_dropbox importerar
+            # create_final_excel lat vid körning.
             try:
-                from copy_to_dropbox import (  # pyright: ignore[reportMissingImports]
-                    copy_date_folder_to_dropbox,
-                    find_dropbox_folder,
-                )
+                if _dropbox_helpers is None:
+                    _add_to_sys_path(DROPBOX_DIR)
+                    from copy_to_dropbox import (  # pyright: ignore[reportMissingImports]
+                        copy_date_folder_to_dropbox,
+                        find_dropbox_folder,
+                    )
+
+                    _dropbox_helpers = (copy_date_folder_to_dropbox, find_dropbox_folder)
+                copy_date_folder_to_dropbox, find_dropbox_folder = _dropbox_helpers
 
                 log_info(f"Kopierar {date_folder.name} till Dropbox...")
 
@@ -1471,10 +1890,6 @@ def copy_to_dropbox(date_folder: Path) -> bool:
             except ImportError as e:
                 log_error(f"Kunde inte importera copy_to_dropbox: {e}")
                 return False
-            finally:
-                # Ta bort från sys.path
-                if str(DROPBOX_DIR) in sys.path:
-                    sys.path.remove(str(DROPBOX_DIR))
 
         # Om skriptet saknas
         log_error(f"copy_to_dropbox.py saknas: {dropbox_script}")
@@ -1482,31 +1897,33 @@ def copy_to_dropbox(date_folder: Path) -> bool:
 
     except Exception as e:
         log_error(f"Fel vid Dropbox-kopiering: {e}")
-        import traceback
-
-        traceback.print_exc()
+        log_error(traceback.format_exc().rstrip())
         return False
 
 
+# MAX_KUN_DAG-rad i 1_poit/config.txt (inledande blanktecken tillåts, som tidigare strip())
+_MAX_KUN_DAG_LINE_RE = re.compile(r"^[ \t]*MAX_KUN_DAG=.*$", re.MULTILINE)
+
+
 def update_config_with_master_number(master_number: int):
     """Uppdatera alla config-filer med master-nummer."""
     log_info(f"Uppdaterar config-filer med master-nummer: {master_number}")
 
     try:
-        # Uppdatera 1_poit/config.txt
+        # Uppdatera 1_poit/config.txt (en läsning, en substitution, skriv bara vid ändring)
         config_poit = POIT_DIR / "config.txt"
-        if config_poit.exists():
-            lines = []
-            with open(config_poit, "r", encoding="utf-8") as f:
-                for line in f:
-                    if line.strip().startswith("MAX_KUN_DAG="):
-                        # Sätt till master-numret för scraping
-                        lines.append(f"MAX_KUN_DAG={master_number}\n")
-                    else:
-                        lines.append(line)
-            with open(config_poit, "w", encoding="utf-8") as f:
-                f.writelines(lines)
-            log_info(f"  - Uppdaterade {config_poit.name}")
+        try:
+            text = config_poit.read_text(encoding="utf-8")
+        except FileNotFoundError:
+            text = None
+        if text is not None:
+            # Sätt till master-numret för scraping
+            new_text = _MAX_KUN_DAG_LINE_RE.sub(f"MAX_KUN_DAG={master_number}", text)
+            if new_text != text:
+                config_poit.write_text(new_text, encoding="utf-8")
+                log_info(f"  - Uppdaterade {config_poit.name}")
+            else:
+                log_info(f"  - {config_poit.name} redan uppdaterad")
 
         # Uppdatera 2_segment_info/config_ny.txt
         # VIKTIGT: Bara uppdatera max_companies-värden, behåll alla thresholds och andra inställningar
@@ -1517,52 +1934,37 @@ def update_config_with_master_number(master_number: int):
             parser.optionxform = str  # Behåll original case
             parser.read(config_segment, encoding="utf-8")
 
-            # Uppdatera RUNNER-sektionen (bara max_companies)
-            if not parser.has_section("RUNNER"):
-                parser.add_section("RUNNER")
-            parser.set("RUNNER", "max_companies_for_testing", str(master_number))
-
-            # Uppdatera ANALYZE-sektionen (bara max_companies)
-            if not parser.has_section("ANALYZE"):
-                parser.add_section("ANALYZE")
-            parser.set("ANALYZE", "analyze_max_companies", str(master_number))
-            # BEHÅLLER alla andra ANALYZE-inställningar (modeller, thresholds, etc.)
-
-            # Uppdatera VERIFY-sektionen (bara max_companies)
-            if not parser.has_section("VERIFY"):
-                parser.add_section("VERIFY")
-            parser.set("VERIFY", "verify_max_companies", str(master_number))
-            # BEHÅLLER verify_domain_confidence_threshold och andra inställningar
-
-            # Uppdatera FINALIZE-sektionen (bara max_companies)
-            if not parser.has_section("FINALIZE"):
-                parser.add_section("FINALIZE")
-            parser.set("FINALIZE", "finalize_max_companies", str(master_number))
-
-            # Uppdatera SITE-sektionen (bara max_antal)
-            if not parser.has_section("SITE"):
-                parser.add_section("SITE")
-            parser.set("SITE", "site_max_antal", str(master_number))
-            # BEHÅLLER site_enabled, site_threshold
-
-            # Uppdatera AUDIT-sektionen (bara max_antal)
-            if not parser.has_section("AUDIT"):
-                parser.add_section("AUDIT")
-            parser.set("AUDIT", "audit_max_antal", str(master_number))
-            # BEHÅLLER audit_enabled, audit_threshold, audit_depth
-
-            # Uppdatera MAIL-sektionen (bara max_companies)
-            if not parser.has_section("MAIL"):
-                parser.add_section("MAIL")
-            parser.set("MAIL", "mail_max_companies", str(master_number))
-            # BEHÅLLER mail_enabled, mail_min_probability och andra inställningar från config
-
-            # Skriv tillbaka (behåller alla andra värden)
-            with open(config_segment, "w", encoding="utf-8") as f:
-                parser.write(f)
-            log_info(
-                f"  - Uppdaterade {config_segment.name} (endast max_companies, behåller alla thresholds och inställningar)"
-            )
+            # (sektion, nyckel) - bara max_companies/max_antal sätts. BEHÅLLER modeller,
+            # thresholds (t.ex. verify_domain_confidence_threshold), site/audit/mail_enabled
+            # m.m. - låt config bestämma.
+            limit_keys = [
+                ("RUNNER", "max_companies_for_testing"),
+                ("ANALYZE", "analyze_max_companies"),
+                ("VERIFY", "verify_max_companies"),
+                ("FINALIZE", "finalize_max_companies"),
+                ("SITE", "site_max_antal"),
+                ("AUDIT", "audit_max_antal"),
+                ("MAIL", "mail_max_companies"),
+            ]
+            value = str(master_number)
+            changed = False
+            for section, key in limit_keys:
+                if not parser.has_section(section):
+                    parser.add_section(section)
+                    changed = True
+                if parser.get(section, key, raw=True, fallback=None) != value:
+                    parser.set(section, key, value)
+                    changed = True
+
+            # Skriv tillbaka bara om något ändrats (behåller alla andra värden)
+            if changed:
+                with open(config_segment, "w", encoding="utf-8") as f:
+                    parser.write(f)
+                log_info(
+                    f"  - Uppdaterade {config_segment.name} (endast max_companies, behåller alla thresholds och inställningar)"
+                )
+            else:
+                log_info(f"  - {config_segment.name} redan uppdaterad")
 
         # Sätt miljövariabler för att begränsa antal (men inte överskriva thresholds)
         os.environ["RUNNER_MAX_COMPANIES_FOR_TESTING"] = str(master_number)
@@ -1577,6 +1979,39 @@ def update_config_with_master_number(master_number: int):
     return True
 
 
+# -D, -DD, -MMDD eller -YYYYMMDD
+_DATE_ARG_RE = re.compile(r"-([0-9]{8}|[0-9]{4}|[0-9]{1,2})")
+# Numeriska argument: "10" / "-4" (master-nummer) eller "-15" / "-1107" / "-20251107" (datum)
+_NUMBER_ARG_RE = re.compile(r"(-?)([0-9]+)")
+# Kända flaggor -> intern nyckel
+_FLAG_ARGS = {
+    "--visible": "visible",
+    "-v": "visible",
+    "--alla": "alla",
+    "--from-segment": "alla",
+    "--resume": "resume",
+    "--help": "help",
+    "-h": "help",
+}
+
+
+def _format_date_parts(
+    year: int, month: int, day: int, clamp_to_month_end: bool = False
+) -> Optional[str]:
+    """
+    Bygg YYYYMMDD från delar. Returnerar None om datumet är ogiltigt.
+    Med clamp_to_month_end blir t.ex. dag 31 i en 30-dagarsmånad den 30:e.
+    """
+    if month < 1 or month > 12 or day < 1 or day > 31:
+        return None
+    if clamp_to_month_end:
+        day = min(day, monthrange(year, month)[1])
+    try:
+        return datetime(year, month, day).strftime("%Y%m%d")
+    except ValueError:
+        return None
+
+
 def parse_date_argument(date_arg: str) -> Optional[str]:
     """
     Parse datumargument i olika format:
@@ -1585,109 +2020,89 @@ def parse_date_argument(date_arg: str) -> Optional[str]:
     - -20251107 = komplett datum (år, månad, dag)
     Returnerar YYYYMMDD-sträng eller None om ogiltigt.
     """
-    if not date_arg.startswith("-"):
+    match = _DATE_ARG_RE.fullmatch(date_arg)
+    if not match:
         return None
+    date_part = match.group(1)
 
-    try:
-        date_part = date_arg[1:]  # Ta bort minus-tecknet
+    # Format 1: Komplett datum (8 siffror) -20251107
+    if len(date_part) == 8:
+        return _format_date_parts(
+            int(date_part[:4]), int(date_part[4:6]), int(date_part[6:8])
+        )
 
-        now = datetime.now()
+    now = datetime.now()
 
-        # Format 1: Komplett datum (8 siffror) -20251107
-        if len(date_part) == 8 and date_part.isdigit():
-            year = int(date_part[:4])
-            month = int(date_part[4:6])
-            day = int(date_part[6:8])
-            if month < 1 or month > 12 or day < 1 or day > 31:
-                return None
-            try:
-                target_date = datetime(year, month, day)
-                return target_date.strftime("%Y%m%d")
-            except ValueError:
-                return None
+    # Format 2: Månad och dag (4 siffror) -1107
+    if len(date_part) == 4:
+        return _format_date_parts(
+            now.year, int(date_part[:2]), int(date_part[2:4]), clamp_to_month_end=True
+        )
 
-        # Format 2: Månad och dag (4 siffror) -1107
-        elif len(date_part) == 4 and date_part.isdigit():
-            month = int(date_part[:2])
-            day = int(date_part[2:4])
-            if month < 1 or month > 12 or day < 1 or day > 31:
-                return None
-            try:
-                target_date = datetime(now.year, month, day)
-                return target_date.strftime("%Y%m%d")
-            except ValueError:
-                from calendar import monthrange
-
-                last_day = monthrange(now.year, month)[1]
-                if day > last_day:
-                    target_date = datetime(now.year, month, last_day)
-                    return target_date.strftime("%Y%m%d")
-                return None
+    # Format 3: Bara dag (1-2 siffror) -7 eller -07
+    return _format_date_parts(
+        now.year, now.month, int(date_part), clamp_to_month_end=True
+    )
 
-        # Format 3: Bara dag (1-2 siffror) -7 eller -07
-        elif len(date_part) <= 2 and date_part.isdigit():
-            day = int(date_part)
-            if day < 1 or day > 31:
-                return None
-            try:
-                target_date = datetime(now.year, now.month, day)
-                return target_date.strftime("%Y%m%d")
-            except ValueError:
-                from calendar import monthrange
-
-                last_day = monthrange(now.year, now.month)[1]
-                if day > last_day:
-                    target_date = datetime(now.year, now.month, last_day)
-                    return target_date.strftime("%Y%m%d")
-                return None
 
-        return None
-    except (ValueError, IndexError):
-        return None
+async def _run_evaluation_phase(latest_date_dir: Path):
+    """
+    STEG 5: evaluation, site generation och audits för en datummapp.
+
+    Körs som en coroutine under ett enda asyncio.run() så att event loop och
+    dess standard-executor (to_thread) lever kvar genom alla tre delstegen.
+    """
+    # Kör evaluation
+    log_info("Kör evaluation av företag...")
+    total_evaluated, worthy_count = await run_company_evaluation(latest_date_dir)
+
+    if worthy_count > 0:
+        percentage = 0.25  # 25% som standard
+        log_info(f"Genererar hemsidor för {percentage * 100:.0f}% av värda företag...")
+        total_worthy, generated_count = await generate_sites_for_worthy_companies(
+            latest_date_dir, percentage
+        )
+
+        log_info("Site generation sammanfattning:")
+        log_info(f"  - Värda företag: {total_worthy}")
+        log_info(f"  - Genererade hemsidor: {generated_count}")
+    else:
+        log_warn("Inga värda företag hittades - hoppar över site generation")
+
+    # Kör audits för företag med verifierad domän
+    log_info("")
+    log_info("Kör audits för företag med befintlig hemsida...")
+    qualified_count, audited_count = await run_audits_for_qualified_companies(
+        latest_date_dir
+    )
+    if audited_count > 0:
+        log_info("Audit sammanfattning:")
+        log_info(f"  - Kvalificerade företag: {qualified_count}")
+        log_info(f"  - Genomförda audits: {audited_count}")
 
 
 def main():
     """Huvudfunktion - kör hela pipelinen."""
-    # Initiera loggfil direkt
-    setup_run_logging()
-    log_info(f"Run-logg: {RUN_LOG_FILE}")
-    
-    # Försök skaffa pipeline-lock för att förhindra samtidiga körningar
-    if not acquire_pipeline_lock():
-        return 1
-
-    # Parse arguments - hantera master_number, datumargument och --visible
+    # Parse arguments först - --help och felaktiga argument ska inte skapa
+    # run-logg eller ta pipeline-lock
     raw_args = sys.argv[1:]
 
     master_number = None
     target_date_str = None
     visible_chrome = False  # HEADLESS: Visa Chrome-fönster?
     skip_to_segment = False  # Hoppa över scraping och rådata, starta från segmentering
+    resume = False  # Återuppta från pipeline_status.json i stället för ny körning
 
     # Parse argumenten manuellt för att hantera både nummer och -15 format
     for arg in raw_args:
-        if arg == "--visible" or arg == "-v":
+        flag = _FLAG_ARGS.get(arg)
+        if flag == "visible":
             visible_chrome = True
-        elif arg == "--alla" or arg == "--from-segment":
+        elif flag == "alla":
             skip_to_segment = True
-        elif arg.startswith("-") and arg[1:].isdigit():
-            # Först kolla om det är ett kort master-nummer (1-2 siffror, t.ex. -4)
-            num_part = arg[1:]
-            if len(num_part) <= 2:
-                # Detta är master-nummer (t.ex. -4)
-                master_number = int(num_part)
-            else:
-                # Detta är ett datumargument (t.ex. -15, -1107, -20251107)
-                parsed_date = parse_date_argument(arg)
-                if parsed_date:
-                    target_date_str = parsed_date
-                else:
-                    log_error(f"Ogiltigt datumargument: {arg}")
-                    return 1
-        elif arg.isdigit():
-            # Detta är master-nummer
-            master_number = int(arg)
-        elif arg in ("--help", "-h"):
+        elif flag == "resume":
+            resume = True
+        elif flag == "help":
             print("""Kör HEADLESS datapipeline (snabbare scraping)
 
 Användning:
@@ -1695,6 +2110,7 @@ Användning:
   python headless_main.py 10                 # Kör med master-nummer 10
   python headless_main.py 10 --visible       # Visa Chrome (för CAPTCHA)
   python headless_main.py --alla             # Starta från segmentering (hoppa över scraping)
+  python headless_main.py --resume           # Fortsätt avbruten körning (ingen cleanup)
   python headless_main.py 5 -1218            # Master 5, datum 18 december
   python headless_main.py --help             # Visa denna hjälp
 
@@ -1702,6 +2118,8 @@ Argument:
   master_number                     Master-nummer som styr antal företag genom hela pipelinen
   --visible, -v                     Visa Chrome-fönster (för debugging/CAPTCHA)
   --alla, --from-segment            Hoppa över scraping och rådata, starta från segmentering
+  --resume                          Återuppta från pipeline_status.json: hoppa över cleanup
+                                    och steg som redan är markerade klara
   -<nummer>                         Master-nummer (1-2 siffror, t.ex. -4 för 4 företag)
   -<dag>                            Välj specifik dag i månaden (3+ siffror, t.ex. -15 för 15:e dagen)
   -<månaddag>                       Välj månad och dag (4 siffror, t.ex. -1107 för 11:e månaden, dag 7)
@@ -1713,39 +2131,57 @@ SKILLNAD MOT main.py:
   - Sparar till samma plats (1_poit/info_server/)
 """)
             return 0
+        else:
+            match = _NUMBER_ARG_RE.fullmatch(arg)
+            if match is None:
+                log_error(f"Okänt argument: {arg}")
+                log_info(
+                    "Använd: python headless_main.py [master_number] [-dag] [--visible]"
+                )
+                return 1
+            dash, digits = match.groups()
+            if not dash or len(digits) <= 2:
+                # Master-nummer (t.ex. 10 eller -4)
+                master_number = int(digits)
+            else:
+                # Datumargument (t.ex. -15, -1107, -20251107)
+                parsed_date = parse_date_argument(arg)
+                if parsed_date:
+                    target_date_str = parsed_date
+                else:
+                    log_error(f"Ogiltigt datumargument: {arg}")
+                    return 1
 
-    # Om inget master-nummer angavs, använd None (använder config)
-    if master_number is None and target_date_str is None and len(raw_args) > 0:
-        # Filtrera bort --visible från kontrollen
-        non_flag_args = [a for a in raw_args if a not in ("--visible", "-v")]
-        if non_flag_args:
-            log_error(f"Okänt argument: {non_flag_args[0]}")
-            log_info("Använd: python headless_main.py [master_number] [-dag] [--visible]")
-            return 1
+    # Initiera loggfil direkt
+    setup_run_logging()
+    log_info(f"Run-logg: {RUN_LOG_FILE}")
+    
+    # Försök skaffa pipeline-lock för att förhindra samtidiga körningar
+    if not acquire_pipeline_lock():
+        return 1
 
-    log_info("=" * 60)
-    log_info("STARTAR HEADLESS DATAPIPELINE")
-    log_info("=" * 60)
+    log_section("STARTAR HEADLESS DATAPIPELINE")
     log_info(f"Chrome synlig: {'JA' if visible_chrome else 'NEJ (off-screen)'}")
     log_info(f"Projektrot: {PROJECT_ROOT}")
     log_info(f"Python: {sys.executable}")
-    log_info("Config-filer:")
+    cfg_lines = ["Config-filer:"]
     for cfg_path in [
         PROJECT_ROOT / ".env",
         POIT_DIR / "config.txt",
         SEGMENT_DIR / "config_ny.txt",
     ]:
         exists = "OK" if cfg_path.exists() else "SAKNAS"
-        log_info(f"  - {cfg_path.relative_to(PROJECT_ROOT)}: {exists}")
+        cfg_lines.append(f"  - {cfg_path.relative_to(PROJECT_ROOT)}: {exists}")
+    log_info("\n".join(cfg_lines))
 
     # Varning om inget master-nummer angavs
     if master_number is None:
-        log_warn("⚠️  INGET MASTER-NUMMER ANGIVET!")
         log_warn(
-            "⚠️  Pipeline kommer köra med obegränsat antal företag från config-filer"
+            "⚠️  INGET MASTER-NUMMER ANGIVET!\n"
+            "⚠️  Pipeline kommer köra med obegränsat antal företag från config-filer\n"
+            "⚠️  Använd t.ex. 'py main.py -4' för att begränsa till 4 företag\n"
+            "⚠️  Eller 'py main.py 10' för att begränsa till 10 företag"
         )
-        log_warn("⚠️  Använd t.ex. 'py main.py -4' för att begränsa till 4 företag")
-        log_warn("⚠️  Eller 'py main.py 10' för att begränsa till 10 företag")
 
     # Om datumargument angavs, visa det
     if target_date_str:
@@ -1762,6 +2198,9 @@ SKILLNAD MOT main.py:
     status = load_pipeline_status(target_date_str)
     if status.get("failed_step"):
         log_warn(f"Tidigare avbrott i steg: {status['failed_step']}")
+    if resume and not status.get("completed_steps"):
+        log_warn("--resume: ingen tidigare status för datumet - kör från början")
+        resume = False
 
     # Om master-nummer angivits, uppdatera alla configs
     if master_number is not None:
@@ -1786,36 +2225,51 @@ SKILLNAD MOT main.py:
     failures = []
 
     try:
-        # Steg 0: Kör ALLTID komplett cleanup (gamla mappar + all data för dagens körning)
-        # VIKTIGT: Cleanup körs ALLTID först oavsett pipeline_status för att garantera ren start
-        log_info("=" * 60)
-        log_info("STEG 0: KOMPLETT CLEANUP (körs alltid)")
-        log_info("=" * 60)
+        # Steg 0: Kör komplett cleanup (gamla mappar + all data för dagens körning)
+        # VIKTIGT: Cleanup körs alltid vid ny körning oavsett pipeline_status för att
+        # garantera ren start - bara --resume och --alla hoppar över den
+        log_section("STEG 0: KOMPLETT CLEANUP")
 
-        try:
-            sys.path.insert(0, str(PROJECT_ROOT))
-            from utils.erase import run_full_cleanup
-
-            removed_count, errors = run_full_cleanup(keep_days=7)
-            if errors:
-                for error in errors:
-                    log_warn(f"Cleanup-fel: {error}")
-            log_info(f"Cleanup klar: {removed_count} objekt raderade")
-
-            # Återställ pipeline-status efter cleanup (ny körning = ny status)
-            status = {"date": target_date_str, "completed_steps": ["cleanup"]}
+        if resume:
+            log_info(
+                "--resume: hoppar över cleanup, fortsätter efter klara steg: "
+                + ", ".join(status["completed_steps"])
+            )
+            if status.pop("failed_step", None) is not None:
+                save_pipeline_status(target_date_str, status)
+        elif skip_to_segment:
+            # --alla återanvänder befintlig rådata (info_server/, 2_segment_info/in/)
+            # som cleanup annars skulle radera
+            log_info("--alla: hoppar över cleanup - återanvänder befintlig rådata")
+            status = {"date": target_date_str, "completed_steps": []}
             save_pipeline_status(target_date_str, status)
-            log_info("Pipeline-status återställd för ny körning")
-        except ImportError as e:
-            log_error(f"Kunde inte importera cleanup-modul: {e}")
-            import traceback
-
-            traceback.print_exc()
-        except Exception as e:
-            log_error(f"Fel vid körning av cleanup: {e}")
-            import traceback
+        else:
+            try:
+                _add_to_sys_path(PROJECT_ROOT)
+                from utils.erase import run_full_cleanup
 
-            traceback.print_exc()
+                # Cleanup raderar logs/main_*.log - stäng run-loggen under tiden
+                # (Windows kan inte radera en öppen fil) och öppna den igen efteråt
+                _close_run_log()
+                try:
+                    removed_count, errors = run_full_cleanup(keep_days=7)
+                finally:
+                    _open_run_log("a")
+                if errors:
+                    for error in errors:
+                        log_warn(f"Cleanup-fel: {error}")
+                log_info(f"Cleanup klar: {removed_count} objekt raderade")
+
+                # Återställ pipeline-status efter cleanup (ny körning = ny status)
+                status = {"date": target_date_str, "completed_steps": ["cleanup"]}
+                save_pipeline_status(target_date_str, status)
+                log_info("Pipeline-status återställd för ny körning")
+            except ImportError as e:
+                log_error(f"Kunde inte importera cleanup-modul: {e}")
+                log_error(traceback.format_exc().rstrip())
+            except Exception as e:
+                log_error(f"Fel vid körning av cleanup: {e}")
+                log_error(traceback.format_exc().rstrip())
 
         # NOTERA: Chrome-cache rensas INTE automatiskt för att bevara browser-session
         # Kör manuellt vid behov: python 1_poit/automation/clear_chrome_cache.py
@@ -1823,9 +2277,7 @@ SKILLNAD MOT main.py:
         print()
 
         # Steg 1: Starta server (eller använd befintlig)
-        log_info("=" * 60)
-        log_info("STEG 1: SERVER START")
-        log_info("=" * 60)
+        log_section("STEG 1: SERVER START")
 
         server_process = start_server()
         # Om server_process är None kan det betyda:
@@ -1833,35 +2285,31 @@ SKILLNAD MOT main.py:
         # 2. Servern kunde inte startas (FEL - avbryt)
         # Kontrollera om servern faktiskt körs och svarar
         if server_process is None:
-            if not check_server_running():
-                log_error("Kunde inte starta server och ingen server körs - avbryter")
-                mark_failed_step(
-                    target_date_str, status, "server_start", "Health-check misslyckades"
-                )
-                return 1
-            # Verifiera att servern svarar
-            try:
-                import urllib.request
-
-                response = urllib.request.urlopen(
-                    f"{POIT_SERVER_BASE_URL}/health", timeout=2
-                )
-                if response.getcode() != 200:
-                    log_error("Servern körs men svarar inte korrekt - avbryter")
+            health_status = check_server_health()
+            if health_status is None:
+                if _server_port_open():
+                    log_error(
+                        f"Servern körs på port {POIT_SERVER_PORT} men svarar inte på /health - avbryter"
+                    )
                     mark_failed_step(
                         target_date_str,
                         status,
                         "server_start",
-                        "Health-endpoint svarar inte 200",
+                        "Port öppen men /health svarar inte",
                     )
                     return 1
-            except Exception as e:
-                log_error(f"Servern körs men svarar inte på /health: {e} - avbryter")
+                log_error("Kunde inte starta server och ingen server körs - avbryter")
+                mark_failed_step(
+                    target_date_str, status, "server_start", "Health-check misslyckades"
+                )
+                return 1
+            if health_status != 200:
+                log_error("Servern körs men svarar inte korrekt - avbryter")
                 mark_failed_step(
                     target_date_str,
                     status,
                     "server_start",
-                    "Undantag vid health-kontroll",
+                    "Health-endpoint svarar inte 200",
                 )
                 return 1
 
@@ -1871,29 +2319,24 @@ SKILLNAD MOT main.py:
 
         # Om --alla flaggan är satt, hoppa över scraping och rådata
         if skip_to_segment:
-            log_info("=" * 60)
-            log_info("HOPPAR ÖVER SCRAPING OCH RÅDATA")
-            log_info("=" * 60)
+            log_section("HOPPAR ÖVER SCRAPING OCH RÅDATA")
             log_info("Flaggan --alla används - startar från segmentering (STEG 4)")
             log_info("")
             log_info("Markerar scraping och process_raw_data som klara...")
             
             # Markera scraping och process_raw_data som klara
-            mark_step_done(target_date_str, status, "scraping")
-            mark_step_done(target_date_str, status, "process_raw_data")
+            mark_step_done(target_date_str, status, "scraping", "process_raw_data")
             
             log_info("✓ Hoppar över STEG 2 (scraping) och STEG 3 (rådata)")
             log_info("Fortsätter med STEG 4 (segmentering)...")
             print()
         else:
             # Steg 2: HEADLESS SCRAPING
-            log_info("=" * 60)
-            log_info("STEG 2: HEADLESS SCRAPING")
-            log_info("=" * 60)
+            log_section("STEG 2: HEADLESS SCRAPING")
 
         info_server_dir = POIT_DIR / "info_server"
-        # Använd TARGET_DATE om det finns, annars dagens datum
-        date_str = os.environ.get("TARGET_DATE", datetime.now().strftime("%Y%m%d"))
+        # TARGET_DATE är redan satt till target_date_str ovan
+        date_str = target_date_str
         date_folder = info_server_dir / date_str
         today_json = date_folder / f"kungorelser_{date_str}.json"
 
@@ -1921,7 +2364,7 @@ SKILLNAD MOT main.py:
                 
                 try:
                     # Importera headless scraper (dynamisk import från headless_1_poit)
-                    sys.path.insert(0, str(PROJECT_ROOT / "headless_1_poit"))
+                    _add_to_sys_path(PROJECT_ROOT / "headless_1_poit")
                     from scrape import run_headless_scrape  # type: ignore[import-not-found]
                     
                     # Kör headless scraping
@@ -1944,8 +2387,7 @@ SKILLNAD MOT main.py:
                     return 1
                 except Exception as e:
                     log_error(f"Fel vid headless scraping: {e}")
-                    import traceback
-                    traceback.print_exc()
+                    log_error(traceback.format_exc().rstrip())
                     mark_failed_step(target_date_str, status, "scraping", str(e))
                     return 1
                 
@@ -1955,16 +2397,15 @@ SKILLNAD MOT main.py:
         # Hoppa över verifiering om --alla används (vi behöver inte JSON-filen)
         if not skip_to_segment:
             # Först kolla i TARGET_DATE-mappen specifikt
-            target_date_json = date_folder / f"kungorelser_{date_str}.json"
-            if target_date_json.exists() and target_date_json.stat().st_size > 0:
-                log_info(f"✓ Använder JSON-fil: {target_date_json.name}")
+            if today_json.exists() and today_json.stat().st_size > 0:
+                log_info(f"✓ Använder JSON-fil: {today_json.name}")
             else:
                 # Om inte i TARGET_DATE-mappen, sök i alla mappar
                 log_info(
-                    "Ingen JSON i dagens mapp - söker fallback bland info_server/**/kungorelser_*.json"
+                    "Ingen JSON i dagens mapp - söker fallback bland info_server/<datum>/kungorelser_<datum>.json"
                 )
-                json_files = list(info_server_dir.glob("**/kungorelser_*.json"))
-                if not json_files:
+                fallback_json = _find_latest_kungorelser_json(info_server_dir)
+                if fallback_json is None:
                     log_error(
                         f"Ingen kungorelser_*.json fil hittades i {date_folder} eller någon annan mapp"
                     )
@@ -1977,14 +2418,11 @@ SKILLNAD MOT main.py:
                         target_date_str, status, "scraping", "JSON-data saknas"
                     )
                     return 1
-                fallback_json = max(json_files, key=lambda p: p.stat().st_mtime)
                 log_info(f"✓ Använder JSON-fil: {fallback_json.name} (från annan mapp)")
 
         # Steg 3: Kör process_raw_data.py (hoppas över om --alla används)
         if not skip_to_segment:
-            log_info("=" * 60)
-            log_info("STEG 3: BEARBETNING AV RÅDATA")
-            log_info("=" * 60)
+            log_section("STEG 3: BEARBETNING AV RÅDATA")
 
             if is_step_done(status, "process_raw_data"):
                 log_info(
@@ -2009,9 +2447,7 @@ SKILLNAD MOT main.py:
             print()
 
         # Steg 4: Kör segmentering pipeline
-        log_info("=" * 60)
-        log_info("STEG 4: SEGMENTERING PIPELINE")
-        log_info("=" * 60)
+        log_section("STEG 4: SEGMENTERING PIPELINE")
 
         if is_step_done(status, "segment_all"):
             log_info("Hoppar över segmentering (markerad klar i pipeline_status.json)")
@@ -2028,6 +2464,8 @@ SKILLNAD MOT main.py:
                         target_date_str, status, "segment_all", f"exit {exit_code}"
                     )
                     return 1
+                # ALLA.py kan ha skapat en ny datummapp i djupanalys/
+                _TARGET_DATE_DIR_CACHE.clear()
                 mark_step_done(target_date_str, status, "segment_all")
             else:
                 log_error(f"Skript saknas: {alla_script}")
@@ -2039,9 +2477,7 @@ SKILLNAD MOT main.py:
         print()
 
         # Steg 5: Kör evaluation och generera hemsidor för värda företag
-        log_info("=" * 60)
-        log_info("STEG 5: EVALUATION OCH SITE GENERATION")
-        log_info("=" * 60)
+        log_section("STEG 5: EVALUATION OCH SITE GENERATION")
 
         if is_step_done(status, "evaluation"):
             log_info(
@@ -2053,48 +2489,15 @@ SKILLNAD MOT main.py:
             # Hitta TARGET_DATE eller senaste datum-mappen från segmentering
             djupanalys_dir = SEGMENT_DIR / "djupanalys"
             if djupanalys_dir.exists():
-                latest_date_dir = get_target_date_dir(djupanalys_dir)
+                latest_date_dir = get_target_date_dir_cached(djupanalys_dir)
                 if latest_date_dir:
                     log_info(
                         f"Bearbetar datum-mapp: {latest_date_dir.name} (full path: {latest_date_dir})"
                     )
                     evaluation_ran = True
 
-                    # Kör evaluation
-                    log_info("Kör evaluation av företag...")
-                    total_evaluated, worthy_count = asyncio.run(
-                        run_company_evaluation(latest_date_dir)
-                    )
-
-                    if worthy_count > 0:
-                        percentage = 0.25  # 25% som standard
-                        log_info(
-                            f"Genererar hemsidor för {percentage * 100:.0f}% av värda företag..."
-                        )
-                        total_worthy, generated_count = asyncio.run(
-                            generate_sites_for_worthy_companies(
-                                latest_date_dir, percentage
-                            )
-                        )
-
-                        log_info("Site generation sammanfattning:")
-                        log_info(f"  - Värda företag: {total_worthy}")
-                        log_info(f"  - Genererade hemsidor: {generated_count}")
-                    else:
-                        log_warn(
-                            "Inga värda företag hittades - hoppar över site generation"
-                        )
-
-                    # Kör audits för företag med verifierad domän
-                    log_info("")
-                    log_info("Kör audits för företag med befintlig hemsida...")
-                    qualified_count, audited_count = asyncio.run(
-                        run_audits_for_qualified_companies(latest_date_dir)
-                    )
-                    if audited_count > 0:
-                        log_info("Audit sammanfattning:")
-                        log_info(f"  - Kvalificerade företag: {qualified_count}")
-                        log_info(f"  - Genomförda audits: {audited_count}")
+                    # Evaluation, site generation och audits i en och samma event loop
+                    asyncio.run(_run_evaluation_phase(latest_date_dir))
                 else:
                     log_warn(
                         "Hittade ingen datum-mapp i djupanalys/ - hoppar över evaluation"
@@ -2104,16 +2507,13 @@ SKILLNAD MOT main.py:
 
             if evaluation_ran:
                 if latest_date_dir:
+                    # Länkar + Audits-blad i ett load/save-pass per arbetsbok
                     sync_preview_and_audit_links(latest_date_dir)
-                    # Skapa Audits-blad i Excel-filer
-                    create_audits_excel_sheet(latest_date_dir)
                 mark_step_done(target_date_str, status, "evaluation")
         print()
 
         # Steg 6: Kopiera till Dropbox
-        log_info("=" * 60)
-        log_info("STEG 6: KOPIERA TILL DROPBOX")
-        log_info("=" * 60)
+        log_section("STEG 6: KOPIERA TILL DROPBOX")
 
         if is_step_done(status, "dropbox"):
             log_info(
@@ -2123,7 +2523,7 @@ SKILLNAD MOT main.py:
             # Hitta TARGET_DATE eller senaste datum-mappen från segmentering
             djupanalys_dir = SEGMENT_DIR / "djupanalys"
             if djupanalys_dir.exists():
-                latest_date_dir = get_target_date_dir(djupanalys_dir)
+                latest_date_dir = get_target_date_dir_cached(djupanalys_dir)
                 if latest_date_dir:
                     log_info(
                         f"Kopierar datum-mapp: {latest_date_dir.name} (full path: {latest_date_dir})"
@@ -2144,16 +2544,14 @@ SKILLNAD MOT main.py:
         print()
 
         # Steg 7: Bearbeta styrelsedata (10_jocke)
-        log_info("=" * 60)
-        log_info("STEG 7: BEARBETA STYRELSEDATA")
-        log_info("=" * 60)
+        log_section("STEG 7: BEARBETA STYRELSEDATA")
 
         if is_step_done(status, "board_data"):
             log_info("Hoppar över styrelsedata (markerad klar i pipeline_status.json)")
         else:
             jocke_dir = PROJECT_ROOT / "10_jocke"
             if jocke_dir.exists():
-                jocke_date_dir = get_target_date_dir(jocke_dir)
+                jocke_date_dir = get_target_date_dir_cached(jocke_dir)
                 if jocke_date_dir:
                     log_info(
                         f"Bearbetar styrelsedata i: {jocke_date_dir.name} (full path: {jocke_date_dir})"
@@ -2191,21 +2589,19 @@ SKILLNAD MOT main.py:
         log_warn("Avbruten av användaren (Ctrl+C)")
     except Exception as e:
         log_error(f"Oväntat fel: {e}")
-        import traceback
-
-        traceback.print_exc()
+        log_error(traceback.format_exc().rstrip())
         if "status" in locals():
             mark_failed_step(target_date_str, status, "unexpected", str(e))
     finally:
+        # Släpp vilande keep-alive mot /health innan servern stoppas
+        _close_health_conn()
         # Stäng server
         stop_server(server_process)
         # Ta bort pipeline-lock
         release_pipeline_lock()
 
     # Sammanfattning
-    log_info("=" * 60)
-    log_info("SAMMANFATTNING")
-    log_info("=" * 60)
+    log_section("SAMMANFATTNING")
 
     if failures:
         log_error(f"Antal fel: {len(failures)}")